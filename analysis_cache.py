@@ -0,0 +1,199 @@
+# analysis_cache.py
+#
+# Content-addressed cache for /analyze results. Two key levels:
+#   file:<sha256 of upload bytes><extension> -> skip extraction and analysis
+#   text:<sha256 of extracted text>           -> skip analysis when only the
+#                                                file bytes changed
+# plus page:<page fingerprint> entries holding per-slide intermediates (see
+# nlp_utils.cached_page_features), so a revised deck only recomputes the
+# slides that changed.
+# Both are salted with version_fingerprint(), so editing SECTION_CRITERIA, the
+# analysis code or the model invalidates old entries. Entries live in an
+# in-memory LRU bounded by count and serialized size, backed by a SQLite file
+# evicted by total size.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.getenv('PITCH_CACHE_PATH') or os.path.join(_HERE, '.cache', 'analysis.sqlite3')
+CACHE_MEMORY_ITEMS = int(os.getenv('PITCH_CACHE_MEMORY_ITEMS', '256'))
+# Measured as JSON bytes; live objects take several times that
+CACHE_MEMORY_MAX_BYTES = int(os.getenv('PITCH_CACHE_MEMORY_MB', '32')) * 1024 * 1024
+CACHE_MAX_BYTES = int(os.getenv('PITCH_CACHE_MAX_MB', '512')) * 1024 * 1024
+# Once over the cap, evict least recently used entries down to this share of it
+EVICT_TO = 0.9
+EVICT_BATCH = 500
+
+# Everything whose change alters an analysis result
+FINGERPRINT_FILES = ['nlp_utils.py', 'nlp_resources.py', 'pipeline.py', 'pitch_model.py', 'keyword_model.py', 'sentiment_model.py', 'text_extractor.py', 'similarity_index.py']
+
+@lru_cache(maxsize=None)
+def version_fingerprint():
+    from nlp_utils import SECTION_CRITERIA
+    from pitch_model import MODEL_PATH, VECTORIZER_PATH, COMPACT_MODEL_PATH
+    from keyword_model import KEYWORD_CORPUS, KEYWORD_VECTORIZER_PATH
+    h = hashlib.sha256()
+    h.update(json.dumps(SECTION_CRITERIA, sort_keys=True).encode())
+    paths = [os.path.join(_HERE, name) for name in FINGERPRINT_FILES] + [MODEL_PATH, VECTORIZER_PATH, KEYWORD_CORPUS]
+    for optional in (KEYWORD_VECTORIZER_PATH, COMPACT_MODEL_PATH):
+        if os.path.exists(optional):
+            paths.append(optional)
+    for path in paths:
+        with open(path, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+def file_key(content_hash, suffix):
+    """content_hash: hex sha256 of the uploaded bytes."""
+    return f"file:{version_fingerprint()}:{content_hash}{suffix.lower()}"
+
+def page_key(fingerprint):
+    """fingerprint: text_extractor.page_fingerprint of the page text."""
+    return f"page:{version_fingerprint()}:{fingerprint}"
+
+def text_key(text, page_starts=None):
+    h = hashlib.sha256(text.encode('utf-8', errors='surrogatepass'))
+    if page_starts:
+        # Same text split into different pages reports different section pages
+        h.update(json.dumps(page_starts).encode())
+    return f"text:{version_fingerprint()}:{h.hexdigest()}"
+
+class AnalysisCache:
+    """
+    Bounded LRU in memory in front of a size-capped SQLite store.
+    path=None keeps everything in memory only.
+    """
+
+    def __init__(self, path=CACHE_PATH, memory_items=CACHE_MEMORY_ITEMS, max_bytes=CACHE_MAX_BYTES,
+                 memory_max_bytes=CACHE_MEMORY_MAX_BYTES):
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.memory_max_bytes = memory_max_bytes
+        # key -> (value, serialized size)
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            # Running byte total of entries, kept in step with every write (in
+            # the same transaction) so put() never has to sum the whole table
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._db.execute("INSERT OR IGNORE INTO meta (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM entries")
+
+    def _count(self, key, outcome):
+        level = key.split(':', 1)[0]
+        counters = self._counters.setdefault(level, {'memory_hits': 0, 'disk_hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+    def _remember(self, key, value, size):
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        if size > self.memory_max_bytes:
+            return  # would evict everything else; disk still has it
+        self._memory[key] = (value, size)
+        self._memory_bytes += size
+        while len(self._memory) > self.memory_items or self._memory_bytes > self.memory_max_bytes:
+            self._memory_bytes -= self._memory.popitem(last=False)[1][1]
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count(key, 'memory_hits')
+                return self._memory[key][0]
+            row = None
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count(key, 'misses')
+                return None
+            self._db.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            raw = zlib.decompress(row[0])
+            value = json.loads(raw)
+            self._remember(key, value, len(raw))
+            self._count(key, 'disk_hits')
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if self._db is None and not self.memory_items:
+                return
+            raw = json.dumps(value).encode()
+            self._remember(key, value, len(raw))
+            if self._db is None:
+                return
+            blob = zlib.compress(raw)
+            # IMMEDIATE: other processes share the file and the byte total
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, blob, len(blob), time.time()),
+                )
+                total = self._add_bytes(len(blob) - (old[0] if old else 0))
+                if total > self.max_bytes:
+                    self._evict(total)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _add_bytes(self, delta):
+        self._db.execute("UPDATE meta SET value = value + ? WHERE name = 'bytes'", (delta,))
+        return self._db.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+
+    def _evict(self, total):
+        # Drop least recently used entries down to EVICT_TO of the cap, so
+        # the next puts don't each cross it again
+        target = int(self.max_bytes * EVICT_TO)
+        while total > target:
+            rows = self._db.execute("SELECT key, size FROM entries ORDER BY accessed LIMIT ?", (EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+            doomed, freed = [], 0
+            for key, size in rows:
+                if total - freed <= target:
+                    break
+                doomed.append((key,))
+                freed += size
+            self._db.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            total = self._add_bytes(-freed)
+
+    def find_upload(self, content_hash):
+        """The cached result for an upload's sha256 under any analysis version and extension (disk only), or None."""
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM entries WHERE key LIKE ? ORDER BY accessed DESC LIMIT 1", (f"file:%:{content_hash}%",)
+            ).fetchone()
+        return None if row is None else json.loads(zlib.decompress(row[0]))
+
+    def stats(self):
+        with self._lock:
+            stats = {'levels': {level: dict(c) for level, c in self._counters.items()},
+                     'memory_items': len(self._memory), 'memory_bytes': self._memory_bytes}
+            if self._db is not None:
+                items = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+                size = self._db.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+                stats.update(disk_items=items, disk_bytes=size)
+            return stats
@@ -1,12 +1,263 @@
-from fastapi import FastAPI, File, UploadFile
+from fastapi import FastAPI, File, UploadFile, Body, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-import tempfile
+from fastapi.responses import StreamingResponse, PlainTextResponse
+import asyncio
+import hashlib
+import io
+import json
 import os
-from nlp_utils import preprocess_text, extract_keywords, sentiment_scores, readability_score, analyze_sections, SECTION_CRITERIA
-from text_extractor import extract_text
-import re
+import shutil
+import tempfile
+import uuid
+import zipfile
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from nlp_resources import ensure_nltk_data
+from pitch_model import score_texts
+from pipeline import analyze_text_with_signature, extract_upload, join_pages, diff_results
+from analysis_cache import AnalysisCache, file_key, text_key, version_fingerprint
+from worker_pool import AnalysisPool, PoolBusy
+from text_extractor import (PAGE_ITERATORS, MAX_UPLOAD_BYTES, SNIFF_BYTES, UnsupportedFile, ArchiveTooLarge,
+                            sniff_filetype, archive_filetype, check_archive_members)
+from metrics import timer, collect, observe_timings, render as render_metrics, PROFILE_MODES
+from similarity_index import SimilarityIndex, text_signature, NEAR_DUPLICATE
+from job_queue import (JobStore, JobRunner, JobFailed, RetryLater, JOBS_DIR, JOBS_MAX_QUEUED, JOBS_TASK_TIMEOUT, TERMINAL,
+                       public_view, upload_path)
+
+MAX_SCORE_BATCH = int(os.getenv('PITCH_MAX_SCORE_BATCH', '1000'))
+MAX_BATCH_FILES = int(os.getenv('PITCH_MAX_BATCH_FILES', '200'))
+# Uploads up to this size are analyzed from memory; larger ones are spooled to PITCH_SPOOL_DIR
+SPOOL_THRESHOLD = int(os.getenv('PITCH_SPOOL_THRESHOLD_MB', '8')) * 1024 * 1024
+SPOOL_DIR = os.getenv('PITCH_SPOOL_DIR') or None
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Whole request bodies; single files are capped at MAX_UPLOAD_BYTES (PITCH_MAX_UPLOAD_MB)
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_BATCH_UPLOAD_BYTES = int(os.getenv('PITCH_MAX_BATCH_UPLOAD_MB', '500')) * 1024 * 1024
+# Per-request profiling via the X-Profile header ('cpu' or 'memory') is off unless this is set
+PROFILING_ENABLED = os.getenv('PITCH_PROFILING') == '1'
+PROFILE_HEADER = 'X-Profile'
+MAX_SIMILAR = 50
+
+pool = AnalysisPool()
+# Opened in lifespan, so importing api creates no files or databases
+cache = similarity = jobs = None
+
+async def run_job(job, progress):
+    """JobRunner handler: the /analyze pipeline over the job's stored upload."""
+    trace = new_trace()
+    source = job['upload_path']
+    try:
+        with timer('total', into=trace['timings']):
+            result = await analyze_source(source, job['content_hash'], job['suffix'], trace, progress, remove_source=False,
+                                          timeout=JOBS_TASK_TIMEOUT, filename=job['filename'])
+    except WorkerCrashed:
+        # The deck itself may be what kills workers: retry, but only up to PITCH_JOBS_MAX_ATTEMPTS
+        raise RetryLater(30.0, count_attempt=True)
+    except HTTPException as e:
+        if e.status_code == 503:
+            # Pool full of synchronous requests: wait our turn instead of failing
+            raise RetryLater()
+        raise JobFailed(e.detail)
+    return finish(result, trace, job['suffix'], upload_size(source), False)
+
+def index_upload(content_hash, filename, signature):
+    """Add an analyzed upload to the similarity index (signature from analyze_text_with_signature)."""
+    if not similarity.contains(content_hash):
+        similarity.add(content_hash, signature, 'upload', filename)
+
+@asynccontextmanager
+async def lifespan(app):
+    global cache, similarity, jobs
+    ensure_nltk_data()
+    version_fingerprint()
+    cache = AnalysisCache()
+    similarity = SimilarityIndex()
+    jobs = JobRunner(JobStore(), run_job)
+    # Workers load NLP resources and the quality model before the first request
+    pool.start()
+    jobs.start()
+    yield
+    await jobs.shutdown()
+    pool.shutdown()
+
+class WorkerCrashed(HTTPException):
+    """503 for a pool task whose worker died; unlike a busy pool, the same input may crash it again."""
+
+    def __init__(self):
+        super().__init__(status_code=503, detail="Analysis worker crashed, retry shortly", headers={"Retry-After": "5"})
+
+def new_trace(profile=None):
+    """Per-request record of stage timings and, when profiling, the workers' profile reports."""
+    return {'timings': {}, 'profile': profile, 'reports': []}
+
+async def run_in_pool(fn, *args, trace=None, timeout=None):
+    """pool.run with its errors as HTTP errors. timeout: seconds, default PITCH_POOL_TASK_TIMEOUT."""
+    trace = trace if trace is not None else new_trace()
+    try:
+        result, timings, report = await pool.run(collect, fn, args, trace['profile'], timeout=timeout)
+    except PoolBusy:
+        raise HTTPException(status_code=503, detail="Server busy, retry shortly", headers={"Retry-After": "5"})
+    except BrokenProcessPool:
+        # The pool has already started fresh workers
+        raise WorkerCrashed()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analysis timed out")
+    for stage, seconds in timings.items():
+        trace['timings'][stage] = trace['timings'].get(stage, 0.0) + seconds
+    if report:
+        trace['reports'].append(report)
+    return result
+
+def requested_profile(request):
+    mode = request.headers.get(PROFILE_HEADER)
+    if mode is None:
+        return None
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=403, detail="Profiling is disabled (set PITCH_PROFILING=1)")
+    if mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"{PROFILE_HEADER} must be one of {', '.join(PROFILE_MODES)}")
+    return mode
+
+def upload_size(source):
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+def finish(result, trace, suffix, size, include_timings):
+    """Record the request's stage timings and add timings/profile blocks to a copy of result if asked."""
+    observe_timings(trace['timings'], suffix.lower(), size)
+    extra = {}
+    if include_timings:
+        extra['timings'] = {stage: round(seconds * 1000, 2) for stage, seconds in trace['timings'].items()}
+    if trace['reports']:
+        extra['profile'] = trace['reports']
+    return {**result, **extra} if extra else result
+
+class UploadSpool:
+    """
+    An upload as it arrives: hashed, type-sniffed and size-capped chunk by
+    chunk, kept in memory up to SPOOL_THRESHOLD and in a spool file past it,
+    so memory use doesn't grow with the upload. Raises HTTPException 413
+    past max_bytes and 415 as soon as the first bytes rule the file out.
+    """
+
+    def __init__(self, name, suffix, max_bytes=MAX_UPLOAD_BYTES, detect=True):
+        self.name = name
+        self.suffix = suffix.lower()
+        self.max_bytes = max_bytes
+        self.detect = detect
+        self.digest = hashlib.sha256()
+        self.chunks = []
+        self.size = 0
+        self.spool = None
+        self.head = b""
+        self.filetype = None if detect else self.suffix
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise HTTPException(status_code=413, detail=f"{self.name} is larger than {self.max_bytes // (1024 * 1024)} MB")
+        self.digest.update(chunk)
+        if self.filetype is None and len(self.head) < SNIFF_BYTES:
+            self.head += chunk[:SNIFF_BYTES - len(self.head)]
+            if len(self.head) == SNIFF_BYTES:
+                self._sniff()
+        if self.spool is None and self.size > SPOOL_THRESHOLD:
+            self.spool = tempfile.NamedTemporaryFile(delete=False, suffix=self.suffix, dir=SPOOL_DIR)
+            self.spool.writelines(self.chunks)
+            self.chunks = None
+        if self.spool is not None:
+            self.spool.write(chunk)
+        else:
+            self.chunks.append(chunk)
+
+    def _sniff(self):
+        try:
+            self.filetype = sniff_filetype(self.head, self.suffix)
+        except UnsupportedFile as e:
+            self.discard()
+            raise HTTPException(status_code=415, detail=f"{self.name}: {e}")
+
+    def finish(self):
+        """Returns (source, sha256 hex digest, real file type); source is bytes or a spool file path (caller removes it)."""
+        if self.filetype is None:
+            self._sniff()
+        if self.spool is None:
+            source = b"".join(self.chunks)
+        else:
+            self.spool.close()
+            source = self.spool.name
+        if self.detect and self.filetype == '.zip':
+            try:
+                self.filetype = archive_filetype(source)
+            except (UnsupportedFile, ArchiveTooLarge) as e:
+                self.discard()
+                status = 413 if isinstance(e, ArchiveTooLarge) else 415
+                raise HTTPException(status_code=status, detail=f"{self.name}: {e}")
+        return source, self.digest.hexdigest(), self.filetype
+
+    def discard(self):
+        if self.spool is not None:
+            self.spool.close()
+            if os.path.exists(self.spool.name):
+                os.remove(self.spool.name)
+        self.chunks = []
+
+async def receive_upload(file, suffix, detect=True):
+    """
+    Returns (source, sha256 hex digest, file type) for an UploadFile; see
+    UploadSpool. The type comes from the content, not the name: a deck
+    renamed to the wrong extension is still read correctly. detect=False
+    trusts suffix instead (e.g. for zip archives of decks).
+    """
+    upload = UploadSpool(file.filename, suffix, detect=detect)
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        upload.write(chunk)
+    return upload.finish()
+
+class RequestSizeLimit:
+    """
+    ASGI middleware that answers 413 before an upload's body is read: at
+    once when Content-Length is over the path's limit, and as soon as a body
+    without one (chunked) passes it. Starlette spools multipart file parts
+    to disk past 1 MB, so an accepted body doesn't sit in memory either.
+    """
+
+    def __init__(self, app, limits):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope['path']) if scope['type'] == 'http' else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        length = dict(scope['headers']).get(b'content-length')
+        detail = f"Request body is larger than {limit // (1024 * 1024)} MB"
+        if length is not None and length.isdigit() and int(length) > limit:
+            response = PlainTextResponse(detail, status_code=413, headers={"Connection": "close"})
+            return await response(scope, receive, send)
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get('body', b''))
+            if received > limit:
+                # Raised from inside form parsing; FastAPI passes HTTPException through
+                raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# Added before CORS, so CORS wraps it and its 413s carry CORS headers
+app.add_middleware(RequestSizeLimit, limits={
+    '/analyze': MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    '/jobs': MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    '/similar': MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    '/analyze/diff': 2 * MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    '/analyze/batch': MAX_BATCH_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+})
 
 # Allow CORS for local frontend
 app.add_middleware(
@@ -18,69 +269,306 @@ app.add_middleware(
 )
 
 @app.post("/analyze")
-async def analyze_pitch(file: UploadFile = File(...)):
-    print("File received:", file.filename)
-    # Save uploaded file temporarily
+async def analyze_pitch(request: Request, file: UploadFile = File(...), timings: bool = False):
+    """
+    timings=true adds per-stage milliseconds to the response. With profiling
+    enabled, an X-Profile: cpu|memory header profiles this request's analysis.
+    """
     suffix = os.path.splitext(file.filename)[1]
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        tmp.write(await file.read())
-        tmp_path = tmp.name
-
-    # Extract text using extract_text function
-    with open(tmp_path, 'rb') as f:
-        text = extract_text(f, suffix.lower())
-    os.remove(tmp_path)
-
-    # Run analysis
-    preprocessed = preprocess_text(text)
-    keywords = extract_keywords(preprocessed)
-    sentiment = sentiment_scores(text)
-    readability = readability_score(text)
-    section_score, strengths, weaknesses, tips = analyze_sections(text)
-
-    # Generate investor feedback and maturity level (simple logic for now)
-    if section_score >= 8:
-        maturity = 'Series A Ready'
-        investor_feedback = 'Impressive! Your pitch covers all key areas investors look for.'
-    elif section_score >= 6:
-        maturity = 'Seed Ready'
-        investor_feedback = 'Good job! Strengthen your business model and traction sections for more impact.'
-    elif section_score >= 4:
-        maturity = 'Pre-seed Ready'
-        investor_feedback = 'You have the basics. Clarify your problem, solution, and market size for investors.'
+    trace = new_trace(requested_profile(request))
+    with timer('total', into=trace['timings']):
+        with timer('receive', into=trace['timings']):
+            source, content_hash, suffix = await receive_upload(file, suffix)
+        size = upload_size(source)
+        result = await analyze_source(source, content_hash, suffix, trace, filename=file.filename)
+    return finish(result, trace, suffix, size, timings)
+
+async def analyze_source(source, content_hash, suffix, trace=None, progress=None, remove_source=True, timeout=None,
+                         filename=None):
+    """
+    Cached extraction and analysis of upload bytes or a spool file path
+    (removed afterwards unless remove_source is false). Profiled requests
+    bypass the cache. progress: coroutine function awaited with each stage
+    name (see job_queue.JOB_STAGES) as the analysis reaches it. timeout:
+    per pool task, see run_in_pool. A freshly analyzed upload is added to
+    the similarity index under filename; cache hits are already indexed
+    under this or an identical upload.
+    """
+    trace = trace if trace is not None else new_trace()
+    use_cache = trace['profile'] is None
+    try:
+        upload_key = file_key(content_hash, suffix)
+        with timer('cache', into=trace['timings']):
+            result = await asyncio.to_thread(cache.get, upload_key) if use_cache else None
+        if result is not None:
+            return result
+        if progress is not None:
+            await progress('extracting')
+        pages = await run_in_pool(extract_upload, source, suffix, trace=trace, timeout=timeout)
+    finally:
+        if remove_source and isinstance(source, str):
+            os.remove(source)
+    text, page_starts = join_pages(pages)
+
+    # Same text as an earlier upload (e.g. re-exported deck): reuse its analysis
+    extracted_key = text_key(text, page_starts)
+    with timer('cache', into=trace['timings']):
+        result = await asyncio.to_thread(cache.get, extracted_key) if use_cache else None
+    if result is None:
+        if progress is not None:
+            await progress('analyzing')
+        result, signature = await run_in_pool(analyze_text_with_signature, text, page_starts, trace=trace, timeout=timeout)
+        # SQLite writes (and zlib/JSON encoding) stay off the event loop
+        await asyncio.to_thread(cache.put, extracted_key, result)
+        await asyncio.to_thread(index_upload, content_hash, filename, signature)
+    await asyncio.to_thread(cache.put, upload_key, result)
+    return result
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """
+    Queue a deck for analysis and return its job right away; follow it with
+    GET /jobs/{id} or GET /jobs/{id}/events. Uploading a deck that is
+    already queued, running or done returns that job instead (deduplicated).
+    """
+    if jobs.store.counts().get('queued', 0) >= JOBS_MAX_QUEUED:
+        raise HTTPException(status_code=503, detail="Job queue is full, retry shortly", headers={"Retry-After": "30"})
+    source, content_hash, suffix = await receive_upload(file, os.path.splitext(file.filename)[1])
+    job_id = uuid.uuid4().hex
+    path = upload_path(job_id, suffix)
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    if isinstance(source, str):
+        shutil.move(source, path)
     else:
-        maturity = 'Beginner'
-        investor_feedback = 'Your pitch is missing several key sections. Focus on clearly stating the problem, solution, and team.'
-
-    # Section-wise breakdown
-    section_breakdown = []
-    for section in SECTION_CRITERIA:
-        found = False
-        for kw in section['keywords']:
-            if (len(kw.split()) == 1 and re.search(r'\b' + re.escape(kw) + r'\b', text, re.IGNORECASE)) or \
-               (len(kw.split()) > 1 and kw in text.lower()):
-                found = True
-                break
-        strength = 5 if found else 2
-        missing = [] if found else [f"Missing: {section['name']}"]
-        suggestion = section['tip']
-        section_breakdown.append({
-            'name': section['name'],
-            'strength': strength,
-            'missing': missing,
-            'suggestion': suggestion
-        })
+        with open(path, 'wb') as f:
+            f.write(source)
+    job, created = jobs.store.submit(job_id, file_key(content_hash, suffix), content_hash, file.filename, suffix, path)
+    if created:
+        jobs.wake()
+    else:
+        os.remove(path)
+    return {**public_view(job), 'deduplicated': not created}
+
+@app.get("/jobs/stats")
+def job_stats():
+    """Jobs per status, plus how many this process is running and its concurrency limit."""
+    return jobs.stats()
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Status, stage (see job_queue.JOB_STAGES), queue position while queued, and the result once done."""
+    job = jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_view(job)
 
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-sent events: a `progress` event at each stage change, then one
+    `done`, `failed` or `cancelled` event (with the result when done) that
+    ends the stream. Comment lines keep idle connections open.
+    """
+    if jobs.store.get(job_id, with_result=False) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream():
+        async for view in jobs.watch(job_id):
+            if view is None:
+                yield ": keep-alive\n\n"
+                continue
+            event = view['status'] if view['status'] in TERMINAL else 'progress'
+            yield f"event: {event}\ndata: {json.dumps(view)}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    """Cancel a queued or running job; a job that already ended is returned unchanged."""
+    job = jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_view(job)
+
+@app.post("/analyze/diff")
+async def analyze_diff(base: UploadFile = File(...), revised: UploadFile = File(...)):
+    """
+    Analyze two versions of a deck and report what changed: score deltas,
+    sections gained or lost and slide-level changes. The revised deck reuses
+    the cached analysis of every slide it shares with the base.
+    """
+    results = []
+    # One after the other, so the revised deck finds the base's slides cached
+    for file in (base, revised):
+        source, content_hash, suffix = await receive_upload(file, os.path.splitext(file.filename)[1])
+        results.append(await analyze_source(source, content_hash, suffix, filename=file.filename))
+    base_result, revised_result = results
     return {
-        "keywords": keywords,
-        "sentiment": sentiment,
-        "readability": readability,
-        "section_score": section_score,
-        "strengths": strengths,
-        "weaknesses": weaknesses,
-        "tips": tips,
-        "raw_text": text,
-        "investor_feedback": investor_feedback,
-        "maturity_level": maturity,
-        "sections": section_breakdown
-    } 
\ No newline at end of file
+        'base': _version_summary(base.filename, base_result),
+        'revised': _version_summary(revised.filename, revised_result),
+        **diff_results(base_result, revised_result),
+    }
+
+def _version_summary(filename, result):
+    return {'filename': filename, **{key: result[key] for key in ('section_score', 'quality_score', 'maturity_level', 'page_count')}}
+
+def iter_zip_decks(path_or_bytes):
+    """
+    (member name, (source, sha256 hex digest, file type)) for each supported
+    deck inside a zip archive, each read through an UploadSpool; a member
+    that is rejected gives (member name, HTTPException) instead. Raises
+    ArchiveTooLarge before reading anything if members exceed the caps.
+    """
+    source = io.BytesIO(path_or_bytes) if isinstance(path_or_bytes, bytes) else path_or_bytes
+    with zipfile.ZipFile(source) as archive:
+        members = [info for info in archive.infolist()
+                   if not info.is_dir() and os.path.splitext(info.filename)[1].lower() in PAGE_ITERATORS]
+        check_archive_members(members, max_member=MAX_UPLOAD_BYTES, max_total=MAX_BATCH_UPLOAD_BYTES)
+        for info in members:
+            upload = UploadSpool(info.filename, os.path.splitext(info.filename)[1])
+            try:
+                with archive.open(info) as member:
+                    while chunk := member.read(UPLOAD_CHUNK_SIZE):
+                        upload.write(chunk)
+                yield info.filename, upload.finish()
+            except HTTPException as e:
+                yield info.filename, e
+
+def _discard_spools(decks):
+    for _, (source, _, _) in decks:
+        if isinstance(source, str) and os.path.exists(source):
+            os.remove(source)
+
+@app.post("/analyze/batch")
+async def analyze_batch(files: list[UploadFile] = File(...)):
+    """
+    Analyze several decks (or .zip archives of decks). Streams one NDJSON line
+    per deck, {"filename", "result"} or {"filename", "error"}, as each finishes.
+    """
+    decks, rejected = [], []
+    try:
+        for file in files:
+            suffix = os.path.splitext(file.filename)[1].lower()
+            if suffix != '.zip':
+                try:
+                    decks.append((file.filename, await receive_upload(file, suffix)))
+                except HTTPException as e:
+                    rejected.append({"filename": file.filename, "error": e.detail})
+                continue
+            archive, _, _ = await receive_upload(file, suffix, detect=False)
+            try:
+                for name, deck in iter_zip_decks(archive):
+                    if isinstance(deck, HTTPException):
+                        rejected.append({"filename": name, "error": deck.detail})
+                    else:
+                        decks.append((name, deck))
+                    if len(decks) > MAX_BATCH_FILES:
+                        break
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{file.filename} is not a valid zip archive")
+            except ArchiveTooLarge as e:
+                raise HTTPException(status_code=413, detail=f"{file.filename}: {e}")
+            finally:
+                if isinstance(archive, str):
+                    os.remove(archive)
+            if len(decks) > MAX_BATCH_FILES:
+                break
+        if len(decks) > MAX_BATCH_FILES:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_FILES} decks per batch")
+    except BaseException:
+        _discard_spools(decks)
+        raise
+
+    # Keep at most one deck per worker in flight so a big batch can't fill the pool's queue
+    limit = asyncio.Semaphore(max(pool.size, 1))
+
+    async def analyze_one(name, source, content_hash, suffix):
+        async with limit:
+            trace = new_trace()
+            size = upload_size(source)
+            try:
+                with timer('total', into=trace['timings']):
+                    result = await analyze_source(source, content_hash, suffix, trace, filename=name)
+            except HTTPException as e:
+                return {"filename": name, "error": e.detail}
+            return {"filename": name, "result": finish(result, trace, suffix, size, False)}
+
+    async def stream():
+        tasks = [asyncio.create_task(analyze_one(name, source, content_hash, suffix))
+                 for name, (source, content_hash, suffix) in decks]
+        try:
+            for error in rejected:
+                yield json.dumps(error) + "\n"
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+            _discard_spools(decks)
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def similar_hits(signature, k, exclude=None):
+    """
+    Index query results as the API shows them. The API has no logins, so
+    uploaded decks keep only their content hash, never their filename or owner.
+    """
+    hits = []
+    for hit in similarity.query(signature, k=max(1, min(k, MAX_SIMILAR)), exclude=exclude):
+        shown = {'doc_id': hit['doc_id'], 'source': hit['source'], 'similarity': hit['similarity'],
+                 'near_duplicate': hit['similarity'] >= NEAR_DUPLICATE}
+        if hit['source'] == 'corpus':
+            shown['label'] = hit['label']
+        hits.append(shown)
+    return hits
+
+@app.get("/similar")
+def similar(content_hash: str, k: int = 10):
+    """Indexed decks most similar to an indexed one, given its sha256 (the content_hash of /analyze and history rows)."""
+    signature = similarity.signature(content_hash)
+    if signature is None:
+        raise HTTPException(status_code=404, detail="Deck not in the similarity index")
+    return {"similar": similar_hits(signature, k, exclude=content_hash)}
+
+@app.post("/similar")
+async def similar_to_upload(file: UploadFile = File(...), k: int = 10):
+    """
+    Indexed decks most similar to an uploaded one, without analyzing or
+    indexing it. near_duplicate marks hits at or above PITCH_NEAR_DUPLICATE.
+    """
+    source, content_hash, suffix = await receive_upload(file, os.path.splitext(file.filename)[1])
+    signature = await asyncio.to_thread(similarity.signature, content_hash)
+    indexed = signature is not None
+    try:
+        if not indexed:
+            pages = await run_in_pool(extract_upload, source, suffix)
+            signature = await run_in_pool(text_signature, join_pages(pages)[0])
+    finally:
+        if isinstance(source, str):
+            os.remove(source)
+    hits = await asyncio.to_thread(similar_hits, signature, k, content_hash)
+    return {"content_hash": content_hash, "indexed": indexed, "similar": hits}
+
+@app.get("/similar/stats")
+def similar_stats():
+    return similarity.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Stage timing histograms in Prometheus text format."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats()
+
+@app.post("/score/batch")
+async def score_batch(texts: list[str] = Body(..., embed=True)):
+    """Model quality scores for many pitch texts, predicted in one call."""
+    if len(texts) > MAX_SCORE_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_SCORE_BATCH} texts per batch")
+    trace = new_trace()
+    scores = await run_in_pool(score_texts, texts, trace=trace)
+    observe_timings(trace['timings'], 'text', sum(len(t) for t in texts))
+    return {"scores": scores} 
\ No newline at end of file
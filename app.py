@@ -2,12 +2,14 @@
 # app.py
 
 import streamlit as st
+import hashlib
 import os
-import tempfile
 import json
-from datetime import datetime
-from text_extractor import extract_text
-from nlp_utils import preprocess_text, analyze_sections, readability_score, sentiment_scores, SECTION_CRITERIA, extract_keywords
+from text_extractor import extract_pages, join_pages, detect_filetype, UnsupportedFile, ArchiveTooLarge, MAX_UPLOAD_BYTES
+from pipeline import analyze_text
+from history_store import HISTORY_BACKEND, HistoryWriter, open_backend, record_from_result, encode_cursor
+from nlp_resources import warm_up
+from keyword_model import load_keyword_model
 import joblib
 import plotly.graph_objects as go
 import plotly.express as px
@@ -18,7 +20,46 @@ from supabase import create_client, Client
 load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL') or ""
 SUPABASE_KEY = os.getenv('SUPABASE_KEY') or ""
-sb: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+HISTORY_PAGE_SIZE = 20
+
+# Streamlit re-runs this script on every widget interaction; everything
+# expensive below is cached so a rerun only redraws.
+
+@st.cache_resource
+def get_supabase() -> Client:
+    return create_client(SUPABASE_URL, SUPABASE_KEY)
+
+@st.cache_resource
+def load_nlp_resources():
+    # NLTK corpora, lemmatizer, VADER, textstat and the keyword IDF model, once per server process
+    warm_up()
+    load_keyword_model()
+
+@st.cache_resource
+def get_history():
+    # Inserts are batched in the background so saving never holds up a rerun
+    backend = open_backend(HISTORY_BACKEND, get_supabase())
+    return HistoryWriter(backend).start()
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_history_page(user_id, cursor):
+    """One page of the user's analyses (list columns only), newest first, plus one extra row if there is a next page."""
+    return get_history().backend.page(user_id, HISTORY_PAGE_SIZE + 1, cursor)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def fetch_analysis(user_id, analysis_id):
+    return get_history().backend.get(user_id, analysis_id)
+
+@st.cache_data(max_entries=64, show_spinner="Analyzing deck...")
+def analyze_upload(user_id, content_hash, filetype, _data):
+    """Analysis of an upload, cached by (user, content hash, type); the bytes themselves aren't hashed again."""
+    text, page_starts = join_pages(extract_pages(_data, filetype))
+    if not text.strip():
+        return None
+    return analyze_text(text, page_starts)
+
+sb = get_supabase()
+load_nlp_resources()
 
 st.set_page_config(page_title="PitchPerfect AI", layout="wide")
 
@@ -31,6 +72,12 @@ if 'user' not in st.session_state:
     st.session_state.user = {'name': '', 'email': '', 'id': ''}
 if 'selected_analysis' not in st.session_state:
     st.session_state.selected_analysis = None
+if 'history_cursors' not in st.session_state:
+    # Keyset cursor of each history page visited; the last one is shown
+    st.session_state.history_cursors = [None]
+if 'saved_uploads' not in st.session_state:
+    # Content hashes already inserted into analyses during this session
+    st.session_state.saved_uploads = set()
 
 # --- Theme CSS ---
 if st.session_state.dark_mode:
@@ -51,20 +98,27 @@ with st.sidebar:
         if st.button("Upload New Deck", use_container_width=True):
             st.session_state.selected_analysis = None
         st.markdown("<div style='margin:1.5em 0 0.7em 0;font-weight:600;'>Past Analyses</div>", unsafe_allow_html=True)
-        # Fetch analyses from Supabase for this user
+        # Fetch one page of analyses for this user
         user_id = st.session_state.user.get('id', '')
-        analyses = []
-        if user_id:
-            res = sb.table('analyses').select('*').eq('user_id', user_id).order('date', desc=True).execute()
-            if res.data:
-                analyses = res.data
+        cursors = st.session_state.history_cursors
+        analyses = fetch_history_page(user_id, cursors[-1]) if user_id else []
+        has_next = len(analyses) > HISTORY_PAGE_SIZE
+        analyses = analyses[:HISTORY_PAGE_SIZE]
         if analyses:
-            for i, a in enumerate(analyses):
+            for a in analyses:
                 label = f"{a['filename']} ({a['date'][:16]})"
-                if st.button(label, key=f"analysis_{i}"):
-                    st.session_state.selected_analysis = a
+                if st.button(label, key=f"analysis_{a['id']}"):
+                    st.session_state.selected_analysis = a['id']
         else:
             st.info("No analyses yet", icon="⏳")
+        if len(cursors) > 1 or has_next:
+            prev_col, next_col = st.columns(2)
+            if prev_col.button("← Newer", disabled=len(cursors) == 1, use_container_width=True):
+                cursors.pop()
+                st.rerun()
+            if next_col.button("Older →", disabled=not has_next, use_container_width=True):
+                cursors.append(encode_cursor(analyses[-1]))
+                st.rerun()
         st.markdown(f"""
         <div style='margin-top:2.5em;display:flex;align-items:center;gap:0.7em;background:#f5faff;padding:0.7em 1em;border-radius:10px;'>
             <span style='font-size:1.3rem;background:#eaf4ff;border-radius:50%;padding:0.3em 0.7em;color:#007acc;'>👤</span>
@@ -79,6 +133,7 @@ with st.sidebar:
             st.session_state.logged_in = False
             st.session_state.user = {'name': '', 'email': '', 'id': ''}
             st.session_state.selected_analysis = None
+            st.session_state.history_cursors = [None]
             st.rerun()
     st.markdown("<div style='margin:1.5em 0 0.7em 0;'><span style='color:#888;'>🌙</span> Dark Theme</div>", unsafe_allow_html=True)
     if st.button("Toggle Dark Mode"):
@@ -112,7 +167,11 @@ st.markdown("""
 
 # --- Show selected past analysis if any ---
 if st.session_state.selected_analysis:
-    a = st.session_state.selected_analysis
+    a = fetch_analysis(st.session_state.user.get('id', ''), st.session_state.selected_analysis)
+    if a is None:
+        st.session_state.selected_analysis = None
+        st.error("That analysis is no longer available.")
+        st.stop()
     st.subheader(f"Analysis for {a['filename']} ({a['date'][:16]})")
     st.write(a['summary'])
     st.download_button("Download Analysis as Text", a['summary'], file_name=f"{a['filename']}_analysis.txt")
@@ -120,36 +179,44 @@ if st.session_state.selected_analysis:
 
 # --- If file uploaded, show analysis (rest of your analysis code below this) ---
 if uploaded_file:
-    filetype = os.path.splitext(uploaded_file.name)[1].lower()
+    # Streamlit enforces server.maxUploadSize (.streamlit/config.toml); this covers other configs
+    if uploaded_file.size > MAX_UPLOAD_BYTES:
+        st.error(f"File is larger than {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+        st.stop()
+    data = uploaded_file.getvalue()
+    try:
+        # Trust the content, not the extension; also refuses zip bombs posing as PPTX/DOCX
+        filetype = detect_filetype(data, os.path.splitext(uploaded_file.name)[1])
+    except (UnsupportedFile, ArchiveTooLarge) as e:
+        st.error(str(e))
+        st.stop()
     filesize = uploaded_file.size / 1024
     with st.container():
         st.markdown(f"<div style='background:#f5faff;padding:1em 1.5em;border-radius:12px;display:inline-block;margin-bottom:1em;'>"
                     f"<b>Filename:</b> {uploaded_file.name} &nbsp; | &nbsp; <b>Type:</b> {filetype.upper()} &nbsp; | &nbsp; <b>Size:</b> {filesize:.1f} KB"
                     f"</div>", unsafe_allow_html=True)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=filetype) as tmp_file:
-        tmp_file.write(uploaded_file.read())
-        tmp_path = tmp_file.name
-    text = extract_text(tmp_path, filetype)
-    os.unlink(tmp_path)
-    if not text:
+    content_hash = hashlib.sha256(data).hexdigest()
+    user_id = st.session_state.user.get('id', '')
+    analysis = analyze_upload(user_id, content_hash, filetype, data)
+    if analysis is None:
         st.error("Could not extract text from the uploaded file.")
     else:
+        text = analysis['raw_text']
         st.subheader("Extracted Text Preview")
         st.code(text[:1000] + ("..." if len(text) > 1000 else ""), language=None)
-        processed = preprocess_text(text)
-        score, strengths, weaknesses, tips = analyze_sections(text)
-        read_score = readability_score(text)
-        sentiment = sentiment_scores(text)
-        keywords = extract_keywords(text)
+        score = analysis['section_score']
+        strengths, weaknesses, tips = analysis['strengths'], analysis['weaknesses'], analysis['tips']
+        read_score = analysis['readability']
+        sentiment = analysis['sentiment']
+        keywords = analysis['keywords']
         # (Rest of the analysis and chart code as before)
         # ...
-        # Save analysis summary for history in Supabase
-        summary = f"Pitch Analysis for {uploaded_file.name}\n\nSection Coverage: {score}/10\nReadability: {read_score}\nSentiment: {sentiment}\n\nStrengths: {', '.join(strengths)}\nWeaknesses: {', '.join(weaknesses)}\nTips: {', '.join(tips)}\nKeywords: {', '.join(keywords)}\n"
-        user_id = st.session_state.user.get('id', '')
-        if user_id:
-            sb.table('analyses').insert({
-                'user_id': user_id,
-                'filename': uploaded_file.name,
-                'date': datetime.now().isoformat(),
-                'summary': summary
-            }).execute()
+        # Save the analysis to the history store, once per upload
+        if user_id and content_hash not in st.session_state.saved_uploads:
+            history = get_history()
+            history.submit(record_from_result(user_id, uploaded_file.name, analysis, content_hash=content_hash))
+            st.session_state.saved_uploads.add(content_hash)
+            # Write it now (flush skips the batching wait), or the next rerun
+            # would cache the history page without it for the whole ttl
+            history.flush(timeout=5)
+            fetch_history_page.clear()
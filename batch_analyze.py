@@ -0,0 +1,135 @@
+# batch_analyze.py
+#
+# Analyze every deck under a directory:
+#     python -m batch_analyze decks/ --out results.jsonl
+#     python -m batch_analyze decks/ --out results.parquet --workers 8
+#
+# Files are analyzed in batches on a process pool (keyword extraction and
+# model scoring run once per batch). Every finished deck is appended to a
+# JSONL checkpoint right away; re-running the same command skips decks that
+# are already in it, so a crashed run resumes where it stopped.
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from text_extractor import PAGE_ITERATORS
+from worker_pool import POOL_SIZE, init_worker
+
+def iter_deck_paths(root):
+    """Supported deck files under root, in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in PAGE_ITERATORS:
+                yield os.path.join(dirpath, name)
+
+def checkpoint_path(out):
+    return out if out.endswith('.jsonl') else out + '.checkpoint.jsonl'
+
+def load_done(checkpoint):
+    """Paths already recorded in the checkpoint. Torn or blank lines are ignored."""
+    done = set()
+    if os.path.exists(checkpoint):
+        with open(checkpoint, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)['path'])
+                except (ValueError, KeyError):
+                    continue
+    return done
+
+def ends_torn(checkpoint):
+    """True when the checkpoint's last line has no newline (a crash mid-write)."""
+    if not os.path.exists(checkpoint) or os.path.getsize(checkpoint) == 0:
+        return False
+    with open(checkpoint, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b'\n'
+
+def _analyze_batch(paths, include_text):
+    from pipeline import analyze_files
+    records = []
+    for path, result in analyze_files(paths):
+        if not include_text:
+            result.pop('raw_text', None)
+        records.append({'path': path, 'result': result})
+    return records
+
+def run(root, out, workers=POOL_SIZE, batch_size=16, include_text=False):
+    """Analyze every deck under root into out (.jsonl or .parquet). Returns the number of decks analyzed now."""
+    checkpoint = checkpoint_path(out)
+    done = load_done(checkpoint)
+    todo = [p for p in iter_deck_paths(root) if p not in done]
+    print(f"{len(done)} decks already done, {len(todo)} to analyze")
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    finished = 0
+    started = time.perf_counter()
+    torn = ends_torn(checkpoint)
+    with open(checkpoint, 'a', encoding='utf-8') as sink, ProcessPoolExecutor(
+        max_workers=max(workers, 1),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+    ) as executor:
+        if torn:
+            # A crash mid-write leaves a torn last line; start on a fresh one
+            sink.write('\n')
+        futures = {executor.submit(_analyze_batch, batch, include_text): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                records = future.result()
+            except Exception as e:
+                # Leave these decks out of the checkpoint so a re-run retries them
+                print(f"Batch starting at {futures[future][0]} failed: {e}", file=sys.stderr)
+                continue
+            for record in records:
+                sink.write(json.dumps(record) + '\n')
+            sink.flush()
+            os.fsync(sink.fileno())
+            finished += len(records)
+            print(f"{finished}/{len(todo)} decks ({time.perf_counter() - started:.1f}s)")
+    if out.endswith('.parquet'):
+        write_parquet(checkpoint, out)
+    return finished
+
+def write_parquet(checkpoint, out):
+    import pandas as pd
+    rows = []
+    with open(checkpoint, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                result = record['result']
+            except (ValueError, KeyError):
+                # Torn or blank lines, as in load_done
+                continue
+            # Scalars become columns; nested values are kept as JSON strings
+            row = {'path': record['path']}
+            for key, value in result.items():
+                row[key] = json.dumps(value) if isinstance(value, (dict, list)) else value
+            rows.append(row)
+    pd.DataFrame(rows).to_parquet(out, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m batch_analyze', description='Analyze a directory of pitch decks.')
+    parser.add_argument('root', help='directory to scan for .pdf/.pptx/.docx/.txt files')
+    parser.add_argument('--out', required=True, help='output file, .jsonl or .parquet')
+    parser.add_argument('--workers', type=int, default=POOL_SIZE)
+    parser.add_argument('--batch-size', type=int, default=16, help='decks per worker task')
+    parser.add_argument('--include-text', action='store_true', help='keep raw_text in the output')
+    args = parser.parse_args(argv)
+    if not args.out.endswith(('.jsonl', '.parquet')):
+        parser.error('--out must end in .jsonl or .parquet')
+    if args.out.endswith('.parquet'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error('.parquet output needs pyarrow (pip install pyarrow); use .jsonl otherwise')
+    run(args.root, args.out, args.workers, args.batch_size, args.include_text)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
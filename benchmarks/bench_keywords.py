@@ -0,0 +1,57 @@
+# benchmarks/bench_keywords.py
+#
+# Compare keyword extraction against the reference-corpus model with the
+# previous approach (a TfidfVectorizer fitted on each document by itself).
+# Run from the repo root:
+#     python benchmarks/bench_keywords.py --words 500 5000 50000
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def per_document_tfidf(text, top_n=15):
+    # The pre-corpus implementation of nlp_utils.extract_keywords
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    try:
+        vectorizer = TfidfVectorizer(max_features=top_n, stop_words='english')
+        vectorizer.fit_transform([text])
+        return list(vectorizer.get_feature_names_out())
+    except Exception:
+        return []
+
+def synthetic_deck(n_words, seed=0):
+    import pandas as pd
+    words = ' '.join(pd.read_csv(os.path.join(REPO_ROOT, 'pitches_data.csv'))['pitch_text']).lower().split()
+    rng = random.Random(seed)
+    return ' '.join(rng.choice(words) for _ in range(n_words))
+
+def time_call(fn, text, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn(text)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark keyword extraction.')
+    parser.add_argument('--words', type=int, nargs='*', default=[500, 5000, 50000])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args(argv)
+    from keyword_model import load_keyword_model, top_keywords
+    load_keyword_model()
+    for n_words in args.words:
+        text = synthetic_deck(n_words)
+        old = time_call(per_document_tfidf, text, args.runs)
+        new = time_call(top_keywords, text, args.runs)
+        print(f"{n_words:>7} words   per-document fit {old * 1000:8.2f} ms   corpus model {new * 1000:8.2f} ms   "
+              f"x{old / new:.1f}")
+
+if __name__ == '__main__':
+    main()
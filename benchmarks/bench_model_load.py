@@ -0,0 +1,99 @@
+# benchmarks/bench_model_load.py
+#
+# Cold-start cost of the quality model: joblib pickle vs the compact .npz
+# export (see compact_forest.py). Each load runs in a fresh interpreter.
+# Run from the repo root:
+#     python benchmarks/bench_model_load.py --runs 5
+#     python benchmarks/bench_model_load.py --model big_forest.pkl --rows 5000
+#
+# For each format: load time, RSS growth, growth of *private* memory (pages
+# that can't be shared with other workers; Linux only), time to predict
+# --rows random rows, and the largest difference from sklearn's predictions.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child interpreter: argv = format, artifact path, pickle path, rows
+CHILD = r'''
+import json, sys, time, warnings
+warnings.simplefilter('ignore')
+sys.path.insert(0, REPO_ROOT)
+
+def memory_kb():
+    """(RSS, private) in KiB from /proc; private is None where unavailable."""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, None
+    kb = lambda name: int(fields[name].split()[0])
+    return kb('Rss'), kb('Private_Clean') + kb('Private_Dirty')
+
+import numpy as np, joblib
+import compact_forest
+# The API imports sklearn anyway (for the vectorizer); keep that out of the numbers
+import sklearn.ensemble
+fmt, path, pickle_path, rows = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+rss0, private0 = memory_kb()
+started = time.perf_counter()
+if fmt == 'joblib':
+    model = joblib.load(path, mmap_mode='r')
+else:
+    model = compact_forest.load_compact(path, mmap=(fmt == 'npz-mmap'))
+load_s = time.perf_counter() - started
+rss1, private1 = memory_kb()
+X = np.random.default_rng(0).random((rows, model.n_features_in_)).astype(np.float32)
+started = time.perf_counter()
+predictions = model.predict(X)
+predict_s = time.perf_counter() - started
+reference = joblib.load(pickle_path).predict(X)
+print(json.dumps({
+    'load_ms': load_s * 1000,
+    'rss_mb': (rss1 - rss0) / 1024,
+    'private_mb': None if private0 is None else (private1 - private0) / 1024,
+    'predict_ms': predict_s * 1000,
+    'max_abs_diff': float(np.abs(predictions - reference).max()),
+}))
+'''.replace('REPO_ROOT', repr(REPO_ROOT))
+
+def run_child(fmt, path, pickle_path, rows):
+    out = subprocess.run([sys.executable, '-c', CHILD, fmt, path, pickle_path, str(rows)],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare cold model loading: joblib pickle vs compact forest.')
+    parser.add_argument('--model', default=os.path.join(REPO_ROOT, 'pitch_quality_model.pkl'))
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--rows', type=int, default=1000, help='rows to predict after loading')
+    args = parser.parse_args(argv)
+    sys.path.insert(0, REPO_ROOT)
+    from compact_forest import export_forest
+
+    with tempfile.TemporaryDirectory() as tmp:
+        artifacts = {'joblib': args.model}
+        for name, float32 in (('npz', False), ('npz32', True)):
+            artifacts[name] = os.path.join(tmp, f'{name}.npz')
+            export_forest(args.model, artifacts[name], float32)
+        # (label, artifact, how the child loads it)
+        cases = [('joblib', 'joblib', 'joblib'), ('npz-mmap', 'npz', 'npz-mmap'),
+                 ('npz-read', 'npz', 'npz-read'), ('npz32-mmap', 'npz32', 'npz-mmap')]
+        print(f"{'format':<12}{'size KB':>9}{'load ms':>10}{'RSS MB':>9}{'private MB':>12}{'predict ms':>12}{'max diff':>11}")
+        for fmt, artifact, child_fmt in cases:
+            results = [run_child(child_fmt, artifacts[artifact], args.model, args.rows) for _ in range(args.runs)]
+            median = lambda key: statistics.median(r[key] for r in results) if results[0][key] is not None else float('nan')
+            size_kb = os.path.getsize(artifacts[artifact]) / 1024
+            print(f"{fmt:<12}{size_kb:>9.0f}{median('load_ms'):>10.1f}{median('rss_mb'):>9.1f}{median('private_mb'):>12.1f}"
+                  f"{median('predict_ms'):>12.1f}{max(r['max_abs_diff'] for r in results):>11.1e}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
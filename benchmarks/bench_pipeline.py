@@ -0,0 +1,176 @@
+# benchmarks/bench_pipeline.py
+#
+# Stage-by-stage benchmark of extraction and analysis on synthetic decks
+# (see decks.py). Run from the repo root:
+#     python benchmarks/bench_pipeline.py --out bench.json
+#     python benchmarks/bench_pipeline.py --baseline bench.json --threshold 0.15
+#
+# Each case records throughput, p50/p95/p99 latency and the peak Python
+# allocation of one extra traced run; the report also holds the process peak
+# RSS. With --baseline, exits 1 if any case's p50 is more than --threshold
+# slower than in the baseline report.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Time the analysis itself: no per-page cache hits on repeated runs (read when
+# nlp_utils is imported)
+os.environ['PITCH_PAGE_CACHE'] = '0'
+
+from decks import FORMATS, make_deck
+from metrics import peak_rss_mb
+
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def measure(fn, runs, warmup=1):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    timings.sort()
+    return {
+        'runs': runs,
+        'throughput_per_s': runs / sum(timings),
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'p50_ms': percentile(timings, 50) * 1000,
+        'p95_ms': percentile(timings, 95) * 1000,
+        'p99_ms': percentile(timings, 99) * 1000,
+        'peak_alloc_mb': peak / 2**20,
+    }
+
+def run_benchmarks(sizes, formats, runs, stages):
+    from text_extractor import extract_text
+    from nlp_utils import preprocess_text, extract_keywords, sentiment_scores, readability_score, analyze_sections
+    from nlp_resources import warm_up, get_sentiment_analyzer
+    import sentiment_model
+    warm_up()
+    cases = {}
+
+    def record(name, fn):
+        print(f"{name:<32}", end='', flush=True)
+        cases[name] = measure(fn, runs)
+        print(f"p50 {cases[name]['p50_ms']:9.2f} ms   p95 {cases[name]['p95_ms']:9.2f} ms")
+
+    client, scratch = _analyze_client() if 'analyze' in stages else (None, None)
+    for pages in sizes:
+        decks = {fmt: make_deck(fmt, pages) for fmt in formats}
+        if 'extract_text' in stages:
+            for fmt, data in decks.items():
+                record(f"extract_text/{fmt}/{pages}p", lambda: extract_text(data, '.' + fmt))
+        text = extract_text(make_deck('txt', pages), '.txt')
+        preprocessed = preprocess_text(text)
+        text_stages = {
+            'preprocess_text': lambda: preprocess_text(text),
+            'extract_keywords': lambda: extract_keywords(preprocessed),
+            # Without the sentence memo, i.e. a deck never seen before
+            'sentiment_scores': lambda: (sentiment_model._memo.clear(), sentiment_scores(text)),
+            # The old approach, VADER over the whole text at once, for comparison
+            'sentiment_whole_text': lambda: get_sentiment_analyzer().polarity_scores(text),
+            'readability_score': lambda: readability_score(text),
+            'analyze_sections': lambda: analyze_sections(text),
+        }
+        for stage, fn in text_stages.items():
+            if stage in stages:
+                record(f"{stage}/{pages}p", fn)
+        if client is not None:
+            for fmt, data in decks.items():
+                record(f"analyze/{fmt}/{pages}p",
+                       lambda: client.post('/analyze', files={'file': (f'deck.{fmt}', data)}).raise_for_status())
+    if client is not None:
+        client.__exit__(None, None, None)
+        shutil.rmtree(scratch, ignore_errors=True)
+    return cases
+
+def _analyze_client():
+    # Analyze in-process, never serve from the result cache, and keep the
+    # API's stores out of the repo's .cache (paths are read on import)
+    os.environ.setdefault('PITCH_POOL_SIZE', '0')
+    scratch = tempfile.mkdtemp(prefix='bench-pipeline-')
+    os.environ.update({
+        'PITCH_CACHE_PATH': os.path.join(scratch, 'analysis.sqlite3'),
+        'PITCH_HISTORY_BACKEND': 'sqlite',
+        'PITCH_HISTORY_PATH': os.path.join(scratch, 'history.sqlite3'),
+        'PITCH_JOBS_PATH': os.path.join(scratch, 'jobs.sqlite3'),
+        'PITCH_JOBS_DIR': os.path.join(scratch, 'jobs'),
+        'PITCH_SIMILARITY_DIR': os.path.join(scratch, 'similarity'),
+    })
+    import api
+    from analysis_cache import AnalysisCache
+    from fastapi.testclient import TestClient
+    client = TestClient(api.app)
+    client.__enter__()
+    # After startup, which opens the configured cache
+    api.cache = AnalysisCache(path=None, memory_items=0)
+    return client, scratch
+
+def compare(report, baseline, threshold):
+    """Names of cases whose p50 regressed by more than threshold (a fraction)."""
+    regressions = []
+    for name, case in report['cases'].items():
+        old = baseline['cases'].get(name)
+        if old is None:
+            continue
+        change = case['p50_ms'] / old['p50_ms'] - 1
+        marker = 'REGRESSION' if change > threshold else ''
+        print(f"{name:<32} {old['p50_ms']:9.2f} -> {case['p50_ms']:9.2f} ms  {change:+7.1%}  {marker}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+ALL_STAGES = ['extract_text', 'preprocess_text', 'extract_keywords', 'sentiment_scores', 'sentiment_whole_text',
+              'readability_score', 'analyze_sections', 'analyze']
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the extraction and analysis pipeline.')
+    parser.add_argument('--sizes', type=int, nargs='*', default=[1, 20, 200], help='deck sizes in pages')
+    parser.add_argument('--formats', nargs='*', default=FORMATS, choices=FORMATS)
+    parser.add_argument('--stages', nargs='*', default=ALL_STAGES, choices=ALL_STAGES)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--out', help='write the JSON report here')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='allowed p50 slowdown vs baseline (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    cases = run_benchmarks(args.sizes, args.formats, args.runs, set(args.stages))
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'peak_rss_mb': peak_rss_mb(),
+        'cases': cases,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed more than {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
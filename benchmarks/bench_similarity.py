@@ -0,0 +1,104 @@
+# benchmarks/bench_similarity.py
+#
+# Query latency of the similar-pitch index (similarity_index.py) as it
+# grows, against a brute-force scan of every signature. Run from the repo root:
+#     python benchmarks/bench_similarity.py                       # 10k, 100k, 1M decks
+#     python benchmarks/bench_similarity.py --sizes 10000 --queries 500
+#
+# Signatures are synthetic (computing 1M real ones would take far longer
+# than the queries): decks come in clusters of --cluster-size variants of a
+# base signature, each differing from it in a random 0-60% of its values,
+# so every query has genuinely similar neighbours to find. Recall is the
+# share of the brute-force top 10 (similarity >= --min-similarity) that the
+# index also returns.
+
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+def synthetic_signatures(n, cluster_size, rng):
+    from similarity_index import NUM_PERM
+    bases = rng.integers(0, 2**31 - 1, (n // cluster_size + 1, NUM_PERM), dtype=np.uint32)
+    signatures = bases[np.arange(n) // cluster_size].copy()
+    noise = rng.random((n, NUM_PERM)) < rng.uniform(0.0, 0.6, (n, 1))
+    signatures[noise] = rng.integers(0, 2**31 - 1, int(noise.sum()), dtype=np.uint32)
+    return signatures
+
+def brute_force(signatures, query, k, min_similarity):
+    similarity = (signatures == query).mean(axis=1)
+    top = np.argpartition(-similarity, k)[:k]
+    return {int(i) for i in top if similarity[i] >= min_similarity}
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000
+
+def bench(n, args, rng):
+    from similarity_index import SimilarityIndex
+    directory = tempfile.mkdtemp(prefix='similarity-bench-')
+    try:
+        signatures = synthetic_signatures(n, args.cluster_size, rng)
+        index = SimilarityIndex(directory)
+        started = time.perf_counter()
+        for start in range(0, n, 100_000):
+            index.add_many(((str(i), signatures[i], 'bench', None, None) for i in range(start, min(start + 100_000, n))),
+                           searchable_now=False)
+        index.compact()
+        build_s = time.perf_counter() - started
+        disk_mb = sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory)) / 2**20
+        del signatures
+        # Reopen, as the API would: arrays memory-mapped, nothing preloaded
+        index = SimilarityIndex(directory)
+        mapped = index._arrays['signatures']
+        queries = rng.integers(0, n, args.queries)
+        index_times, brute_times, recalls = [], [], []
+        for doc in queries:
+            query = np.array(mapped[doc])
+            # Perturb the query so it isn't an exact copy of an indexed deck
+            changed = rng.random(len(query)) < 0.1
+            query[changed] = rng.integers(0, 2**31 - 1, int(changed.sum()), dtype=np.uint32)
+            started = time.perf_counter()
+            hits = index.query(query, k=10, min_similarity=args.min_similarity)
+            index_times.append(time.perf_counter() - started)
+            if len(brute_times) < args.brute_queries:
+                started = time.perf_counter()
+                expected = brute_force(mapped, query, 10, args.min_similarity)
+                brute_times.append(time.perf_counter() - started)
+                found = {int(hit['doc_id']) for hit in hits}
+                if expected:
+                    recalls.append(len(found & expected) / len(expected))
+        return {
+            'build_s': build_s, 'disk_mb': disk_mb,
+            'p50_ms': percentile(index_times, 50), 'p95_ms': percentile(index_times, 95),
+            'brute_ms': statistics.median(brute_times) * 1000,
+            'recall': statistics.mean(recalls) if recalls else float('nan'),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark similar-pitch index queries against brute force.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--brute-queries', type=int, default=20, help='queries also answered by brute force')
+    parser.add_argument('--cluster-size', type=int, default=10)
+    parser.add_argument('--min-similarity', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    rng = np.random.default_rng(args.seed)
+    print(f"{'decks':>10}{'build s':>10}{'disk MB':>10}{'p50 ms':>9}{'p95 ms':>9}{'brute ms':>10}{'recall':>8}")
+    for n in args.sizes:
+        r = bench(n, args, rng)
+        print(f"{n:>10}{r['build_s']:>10.1f}{r['disk_mb']:>10.0f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}"
+              f"{r['brute_ms']:>10.1f}{r['recall']:>8.3f}", flush=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,37 @@
+# benchmarks/bench_startup.py
+#
+# Cold-start benchmark: time a fresh interpreter importing a module
+# (default: api). Run from the repo root:
+#     python benchmarks/bench_startup.py --runs 10 api nlp_utils
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def time_import(module, runs):
+    code = (
+        "import time, warnings; warnings.simplefilter('ignore'); "
+        f"t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    )
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure cold import time of project modules.')
+    parser.add_argument('modules', nargs='*', default=['api'])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args(argv)
+    for module in args.modules:
+        timings = time_import(module, args.runs)
+        print(f"{module:<16} median {statistics.median(timings) * 1000:8.1f} ms   "
+              f"min {min(timings) * 1000:8.1f} ms   ({args.runs} runs)")
+
+if __name__ == '__main__':
+    main()
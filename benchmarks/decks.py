@@ -0,0 +1,90 @@
+# benchmarks/decks.py
+#
+# Synthetic pitch decks for benchmarks, built from pitches_data.csv text so
+# the section keywords, vocabulary and sentence shapes are realistic.
+# Same seed and page count always give the same bytes.
+
+import io
+import os
+import random
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORMATS = ['pdf', 'pptx', 'docx', 'txt']
+LINES_PER_PAGE = 12
+
+def _sentences():
+    import csv
+    with open(os.path.join(REPO_ROOT, 'pitches_data.csv'), encoding='utf-8') as f:
+        texts = [row['pitch_text'] for row in csv.DictReader(f)]
+    sentences = []
+    for text in texts:
+        sentences.extend(s.strip() + '.' for s in text.split('.') if s.strip())
+    return sentences
+
+def deck_pages(pages, seed=0):
+    """pages lists of LINES_PER_PAGE sentences each."""
+    sentences = _sentences()
+    rng = random.Random(seed)
+    return [[rng.choice(sentences) for _ in range(LINES_PER_PAGE)] for _ in range(pages)]
+
+def _pdf_escape(line):
+    return line.encode('latin-1', errors='replace').decode('latin-1').replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def make_pdf(pages):
+    # Minimal PDF: one Helvetica text stream per page
+    n = len(pages)
+    font_id = 3 + 2 * n
+    objects = [
+        '<< /Type /Catalog /Pages 2 0 R >>',
+        f"<< /Type /Pages /Kids [{' '.join(f'{3 + 2 * i} 0 R' for i in range(n))}] /Count {n} >>",
+    ]
+    for i, lines in enumerate(pages):
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 842 595] /Contents {4 + 2 * i} 0 R '
+                       f'/Resources << /Font << /F1 {font_id} 0 R >> >> >>')
+        body = 'BT /F1 10 Tf 12 TL 40 560 Td ' + ' '.join(f'({_pdf_escape(line)}) Tj T*' for line in lines) + ' ET'
+        objects.append(f'<< /Length {len(body)} >>\nstream\n{body}\nendstream')
+    objects.append('<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>')
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f'{number} 0 obj\n{obj}\nendobj\n'.encode('latin-1'))
+    xref = out.tell()
+    out.write(f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode())
+    for offset in offsets:
+        out.write(f'{offset:010d} 00000 n \n'.encode())
+    out.write(f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+    return out.getvalue()
+
+def make_pptx(pages):
+    import pptx
+    prs = pptx.Presentation()
+    for lines in pages:
+        slide = prs.slides.add_slide(prs.slide_layouts[1])
+        slide.shapes.title.text = lines[0]
+        slide.placeholders[1].text = '\n'.join(lines[1:])
+    out = io.BytesIO()
+    prs.save(out)
+    return out.getvalue()
+
+def make_docx(pages):
+    import docx
+    document = docx.Document()
+    for i, lines in enumerate(pages):
+        if i:
+            document.add_page_break()
+        for line in lines:
+            document.add_paragraph(line)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+def make_txt(pages):
+    return '\n\f\n'.join('\n'.join(lines) for lines in pages).encode('utf-8')
+
+BUILDERS = {'pdf': make_pdf, 'pptx': make_pptx, 'docx': make_docx, 'txt': make_txt}
+
+def make_deck(fmt, pages, seed=0):
+    """Bytes of a synthetic deck in fmt ('pdf', 'pptx', 'docx' or 'txt')."""
+    return BUILDERS[fmt](deck_pages(pages, seed))
@@ -0,0 +1,425 @@
+# history_store.py
+#
+# Saved analyses, one typed row per analysis instead of a pre-rendered
+# summary string, so history can be filtered and aggregated by score,
+# maturity or section without reparsing. Two interchangeable backends:
+#   SQLiteHistoryBackend   - local file (tests, offline nodes)
+#   SupabaseHistoryBackend - the `analyses` table (see SUPABASE_SCHEMA), the
+#                            default; app.py is the only writer, as it is
+#                            the one behind a login
+# Writes go through HistoryWriter, a bounded write-behind queue drained in
+# batches by a background thread, so saving never blocks a request.
+#
+#     python -m history_store schema                       # SQL for Supabase
+#     python -m history_store migrate past_analyses.json --user-id <id>
+
+import argparse
+import ast
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+HISTORY_BACKEND = os.getenv('PITCH_HISTORY_BACKEND') or 'supabase'
+HISTORY_PATH = os.getenv('PITCH_HISTORY_PATH') or os.path.join(_HERE, '.cache', 'history.sqlite3')
+HISTORY_TABLE = 'analyses'
+HISTORY_MAX_QUEUE = int(os.getenv('PITCH_HISTORY_MAX_QUEUE', '1000'))
+HISTORY_BATCH_SIZE = int(os.getenv('PITCH_HISTORY_BATCH_SIZE', '50'))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('PITCH_HISTORY_FLUSH_INTERVAL', '1.0'))
+
+# Column -> SQLite type. JSON columns hold lists/dicts (jsonb in Supabase).
+COLUMNS = {
+    'user_id': 'TEXT NOT NULL',
+    'filename': 'TEXT',
+    'date': 'TEXT NOT NULL',
+    'content_hash': 'TEXT',
+    'section_score': 'REAL',
+    'quality_score': 'REAL',
+    'readability': 'REAL',
+    'maturity_level': 'TEXT',
+    'sentiment_pos': 'REAL',
+    'sentiment_neu': 'REAL',
+    'sentiment_neg': 'REAL',
+    'sentiment_compound': 'REAL',
+    'page_count': 'INTEGER',
+    'investor_feedback': 'TEXT',
+    'keywords': 'JSON',
+    'strengths': 'JSON',
+    'weaknesses': 'JSON',
+    'tips': 'JSON',
+    'sections': 'JSON',
+    'summary': 'TEXT',
+}
+JSON_COLUMNS = [name for name, kind in COLUMNS.items() if kind == 'JSON']
+# What a history list shows
+LIST_COLUMNS = ['id', 'filename', 'date', 'section_score', 'maturity_level']
+
+SUPABASE_SCHEMA = f"""
+create table if not exists {HISTORY_TABLE} (
+    id bigint generated by default as identity primary key,
+    user_id text not null,
+    filename text,
+    date text not null,
+    summary text
+);
+alter table {HISTORY_TABLE}
+    add column if not exists content_hash text,
+    add column if not exists section_score double precision,
+    add column if not exists quality_score double precision,
+    add column if not exists readability double precision,
+    add column if not exists maturity_level text,
+    add column if not exists sentiment_pos double precision,
+    add column if not exists sentiment_neu double precision,
+    add column if not exists sentiment_neg double precision,
+    add column if not exists sentiment_compound double precision,
+    add column if not exists page_count integer,
+    add column if not exists investor_feedback text,
+    add column if not exists keywords jsonb,
+    add column if not exists strengths jsonb,
+    add column if not exists weaknesses jsonb,
+    add column if not exists tips jsonb,
+    add column if not exists sections jsonb;
+create index if not exists {HISTORY_TABLE}_user_date on {HISTORY_TABLE} (user_id, date desc, id desc);
+create index if not exists {HISTORY_TABLE}_section_score on {HISTORY_TABLE} (section_score);
+"""
+
+def summary_text(filename, result):
+    """The plain-text summary saved with each analysis (and offered as a download)."""
+    return (f"Pitch Analysis for {filename}\n\n"
+            f"Section Coverage: {result.get('section_score')}/10\n"
+            f"Readability: {result.get('readability')}\n"
+            f"Sentiment: {result.get('sentiment')}\n\n"
+            f"Strengths: {', '.join(result.get('strengths') or [])}\n"
+            f"Weaknesses: {', '.join(result.get('weaknesses') or [])}\n"
+            f"Tips: {', '.join(result.get('tips') or [])}\n"
+            f"Keywords: {', '.join(result.get('keywords') or [])}\n")
+
+def record_from_result(user_id, filename, result, date=None, content_hash=None):
+    """A history row for an analyze_text result. raw_text is not stored."""
+    sentiment = result.get('sentiment') or {}
+    return {
+        'user_id': user_id,
+        'filename': filename,
+        'date': date or datetime.now().isoformat(timespec='seconds'),
+        'content_hash': content_hash,
+        'section_score': result.get('section_score'),
+        'quality_score': result.get('quality_score'),
+        'readability': result.get('readability'),
+        'maturity_level': result.get('maturity_level'),
+        'sentiment_pos': sentiment.get('pos'),
+        'sentiment_neu': sentiment.get('neu'),
+        'sentiment_neg': sentiment.get('neg'),
+        'sentiment_compound': sentiment.get('compound'),
+        'page_count': result.get('page_count'),
+        'investor_feedback': result.get('investor_feedback'),
+        'keywords': result.get('keywords') or [],
+        'strengths': result.get('strengths') or [],
+        'weaknesses': result.get('weaknesses') or [],
+        'tips': result.get('tips') or [],
+        'sections': result.get('sections') or [],
+        'summary': summary_text(filename, result),
+    }
+
+def encode_cursor(row):
+    """Keyset cursor for the page after row (the last row of a page)."""
+    return f"{row['date']}|{row['id']}"
+
+def decode_cursor(cursor):
+    date, _, row_id = cursor.rpartition('|')
+    if not date or not row_id.isdigit():
+        raise ValueError(f"Invalid history cursor: {cursor!r}")
+    return date, int(row_id)
+
+class SQLiteHistoryBackend:
+    """History in a local SQLite file; path=':memory:' for throwaway use."""
+
+    def __init__(self, path=HISTORY_PATH):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            self._db.execute("PRAGMA journal_mode=WAL")
+        columns = ', '.join(f"{name} {'TEXT' if kind == 'JSON' else kind}" for name, kind in COLUMNS.items())
+        self._db.execute(f"CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (id INTEGER PRIMARY KEY, {columns})")
+        # Every SQLite index ends in the rowid, so this also serves the (date, id) keyset order
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {HISTORY_TABLE}_user_date ON {HISTORY_TABLE} (user_id, date)")
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {HISTORY_TABLE}_section_score ON {HISTORY_TABLE} (section_score)")
+
+    def insert_many(self, rows):
+        names = list(COLUMNS)
+        values = [
+            tuple(json.dumps(row.get(n)) if n in JSON_COLUMNS else row.get(n) for n in names)
+            for row in rows
+        ]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    f"INSERT INTO {HISTORY_TABLE} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                    values,
+                )
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def page(self, user_id, limit=20, cursor=None, columns=LIST_COLUMNS, maturity_level=None, min_section_score=None):
+        """Up to limit rows for user_id, newest first, after cursor (from encode_cursor)."""
+        where, params = ["user_id = ?"], [user_id]
+        if cursor:
+            date, row_id = decode_cursor(cursor)
+            where.append("(date < ? OR (date = ? AND id < ?))")
+            params += [date, date, row_id]
+        if maturity_level is not None:
+            where.append("maturity_level = ?")
+            params.append(maturity_level)
+        if min_section_score is not None:
+            where.append("section_score >= ?")
+            params.append(min_section_score)
+        sql = (f"SELECT {', '.join(columns)} FROM {HISTORY_TABLE} WHERE {' AND '.join(where)} "
+               f"ORDER BY date DESC, id DESC LIMIT ?")
+        with self._lock:
+            rows = self._db.execute(sql, params + [limit]).fetchall()
+        return [self._decode(columns, row) for row in rows]
+
+    def get(self, user_id, analysis_id):
+        columns = ['id'] + list(COLUMNS)
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(columns)} FROM {HISTORY_TABLE} WHERE user_id = ? AND id = ?",
+                (user_id, analysis_id),
+            ).fetchone()
+        return self._decode(columns, row) if row else None
+
+    def iter_rows(self, columns=LIST_COLUMNS, batch_size=1000):
+        """Every user's rows, oldest id first, fetched batch_size at a time."""
+        columns = ['id'] + [name for name in columns if name != 'id']
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT {', '.join(columns)} FROM {HISTORY_TABLE} WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._decode(columns, row)
+            last_id = rows[-1][0]
+
+    @staticmethod
+    def _decode(columns, row):
+        record = dict(zip(columns, row))
+        for name in JSON_COLUMNS:
+            if record.get(name) is not None:
+                record[name] = json.loads(record[name])
+        return record
+
+class SupabaseHistoryBackend:
+    """History in the Supabase `analyses` table (create its columns with SUPABASE_SCHEMA)."""
+
+    def __init__(self, client=None):
+        if client is None:
+            from supabase import create_client
+            client = create_client(os.getenv('SUPABASE_URL') or "", os.getenv('SUPABASE_KEY') or "")
+        self.client = client
+
+    def insert_many(self, rows):
+        self.client.table(HISTORY_TABLE).insert(list(rows)).execute()
+
+    def page(self, user_id, limit=20, cursor=None, columns=LIST_COLUMNS, maturity_level=None, min_section_score=None):
+        query = self.client.table(HISTORY_TABLE).select(','.join(columns)).eq('user_id', user_id)
+        if cursor:
+            date, row_id = decode_cursor(cursor)
+            query = query.or_(f'date.lt."{date}",and(date.eq."{date}",id.lt.{row_id})')
+        if maturity_level is not None:
+            query = query.eq('maturity_level', maturity_level)
+        if min_section_score is not None:
+            query = query.gte('section_score', min_section_score)
+        res = query.order('date', desc=True).order('id', desc=True).limit(limit).execute()
+        return res.data or []
+
+    def get(self, user_id, analysis_id):
+        res = (self.client.table(HISTORY_TABLE).select('*')
+               .eq('user_id', user_id).eq('id', analysis_id).limit(1).execute())
+        return res.data[0] if res.data else None
+
+    def iter_rows(self, columns=LIST_COLUMNS, batch_size=1000):
+        columns = ['id'] + [name for name in columns if name != 'id']
+        last_id = 0
+        while True:
+            res = (self.client.table(HISTORY_TABLE).select(','.join(columns))
+                   .gt('id', last_id).order('id').limit(batch_size).execute())
+            if not res.data:
+                return
+            yield from res.data
+            last_id = res.data[-1]['id']
+
+def open_backend(kind=HISTORY_BACKEND, client=None):
+    """kind: 'sqlite' (HISTORY_PATH) or 'supabase' (client, or one from SUPABASE_URL/SUPABASE_KEY)."""
+    if kind == 'sqlite':
+        return SQLiteHistoryBackend()
+    if kind == 'supabase':
+        return SupabaseHistoryBackend(client)
+    raise ValueError(f"Unknown history backend {kind!r} (expected 'sqlite' or 'supabase')")
+
+class HistoryWriter:
+    """
+    Write-behind queue in front of a backend. submit() only enqueues; a
+    daemon thread inserts up to batch_size rows at a time, at least every
+    flush_interval seconds. When max_queue rows are waiting, submit() drops
+    the row and returns False rather than blocking.
+    """
+
+    def __init__(self, backend, max_queue=HISTORY_MAX_QUEUE, batch_size=HISTORY_BATCH_SIZE, flush_interval=HISTORY_FLUSH_INTERVAL):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._counters = {'written': 0, 'dropped': 0, 'failed': 0, 'batches': 0}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(self, row):
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._counters['dropped'] += 1
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far is written (or failed)."""
+        self.start()
+        done = threading.Event()
+        self._queue.put(done, timeout=timeout)
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        if self._thread is not None:
+            self.flush(timeout)
+
+    def _run(self):
+        while True:
+            batch, waiters = [], []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if isinstance(item, threading.Event):
+                    # flush() marker: write what we have now
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, batch):
+        try:
+            self.backend.insert_many(batch)
+        except Exception as e:
+            self._counters['failed'] += len(batch)
+            print(f"History write of {len(batch)} rows failed: {e}", file=sys.stderr)
+            return
+        self._counters['written'] += len(batch)
+        self._counters['batches'] += 1
+
+    def stats(self):
+        return {**self._counters, 'queued': self._queue.qsize()}
+
+_SUMMARY_FIELDS = re.compile(r'^(Section Coverage|Readability|Sentiment|Strengths|Weaknesses|Tips|Keywords): ?(.*)$', re.M)
+
+def split_tips(value, known):
+    """
+    Split a ', '-joined tips string. Tips contain commas themselves, so known
+    tip strings are matched whole; anything else falls back to the separator.
+    """
+    tips = []
+    pos = 0
+    while pos < len(value):
+        tip = next((t for t in known if value.startswith(t, pos)), None)
+        if tip is None:
+            end = value.find(', ', pos)
+            tip = value[pos:] if end < 0 else value[pos:end]
+        if tip:
+            tips.append(tip)
+        pos += len(tip)
+        if value.startswith(', ', pos):
+            pos += 2
+    return tips
+
+def parse_summary(summary):
+    """Recover the structured fields of a legacy summary string (see summary_text)."""
+    from nlp_utils import SECTION_CRITERIA
+    from pipeline import maturity_for
+    fields = dict(_SUMMARY_FIELDS.findall(summary))
+    result = {}
+    if 'Section Coverage' in fields:
+        result['section_score'] = float(fields['Section Coverage'].split('/')[0])
+        # Legacy summaries never stored it; it only depends on the score
+        result['maturity_level'] = maturity_for(result['section_score'])[0]
+    if 'Readability' in fields:
+        result['readability'] = float(fields['Readability'])
+    if 'Sentiment' in fields:
+        result['sentiment'] = ast.literal_eval(fields['Sentiment'])
+    for field in ('Strengths', 'Weaknesses', 'Keywords'):
+        value = fields.get(field, '')
+        result[field.lower()] = [item for item in value.split(', ') if item] if value else []
+    # Longest first, so a tip that prefixes another can't cut it short
+    known = sorted((section['tip'] for section in SECTION_CRITERIA), key=len, reverse=True)
+    result['tips'] = split_tips(fields.get('Tips', ''), known)
+    return result
+
+def import_past_analyses(backend, path, user_id):
+    """Copy past_analyses.json entries ({filename, date, summary}) into backend. Returns the row count."""
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    rows = []
+    for entry in entries:
+        # '2025-07-16 19:56' -> ISO with a 'T', so it sorts among newer rows
+        date = datetime.fromisoformat(entry['date']).isoformat(timespec='seconds')
+        row = record_from_result(user_id, entry['filename'], parse_summary(entry['summary']), date=date)
+        # Keep the original text rather than a re-rendered one
+        row['summary'] = entry['summary']
+        rows.append(row)
+    if rows:
+        backend.insert_many(rows)
+    return len(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m history_store', description='Manage the analysis history store.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('schema', help='print the SQL that adds the typed columns to Supabase')
+    migrate = sub.add_parser('migrate', help='import a past_analyses.json file')
+    migrate.add_argument('path', nargs='?', default=os.path.join(_HERE, 'past_analyses.json'))
+    migrate.add_argument('--user-id', required=True, help='owner of the imported analyses')
+    migrate.add_argument('--backend', choices=['sqlite', 'supabase'], default=HISTORY_BACKEND)
+    args = parser.parse_args(argv)
+    if args.command == 'schema':
+        print(SUPABASE_SCHEMA.strip())
+        return 0
+    count = import_past_analyses(open_backend(args.backend), args.path, args.user_id)
+    print(f"Imported {count} analyses from {args.path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
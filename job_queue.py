@@ -0,0 +1,408 @@
+# job_queue.py
+#
+# Durable local job queue behind POST /jobs, so a large deck is analyzed
+# without holding an HTTP connection open for the whole extraction. Jobs,
+# their stage-level progress and their results live in a SQLite file, and
+# each upload is kept in JOBS_DIR until its job ends. No broker needed.
+#
+# JobRunner runs at most JOBS_CONCURRENCY jobs at a time inside the API
+# process; everything else waits in the queue, so a burst of uploads queues
+# up instead of filling the analysis pool. A claimed job holds a lease that
+# its runner renews while working on it. If the process dies, the lease
+# runs out and a runner (in any API process sharing the file) takes the job
+# again, up to JOBS_MAX_ATTEMPTS times.
+#
+# status: queued -> running -> done | failed, or cancelled at any point.
+# stage (while running): see JOB_STAGES.
+
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+import zlib
+from worker_pool import POOL_SIZE
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+JOBS_PATH = os.getenv('PITCH_JOBS_PATH') or os.path.join(_HERE, '.cache', 'jobs.sqlite3')
+JOBS_DIR = os.getenv('PITCH_JOBS_DIR') or os.path.join(_HERE, '.cache', 'jobs')
+JOBS_CONCURRENCY = int(os.getenv('PITCH_JOBS_CONCURRENCY', str(max(POOL_SIZE, 1))))
+JOBS_MAX_QUEUED = int(os.getenv('PITCH_JOBS_MAX_QUEUED', '1000'))
+JOBS_MAX_ATTEMPTS = int(os.getenv('PITCH_JOBS_MAX_ATTEMPTS', '3'))
+JOBS_LEASE = float(os.getenv('PITCH_JOBS_LEASE', '30'))
+# Per pool task; nobody is waiting on a job's HTTP response, so well above PITCH_POOL_TASK_TIMEOUT
+JOBS_TASK_TIMEOUT = float(os.getenv('PITCH_JOBS_TASK_TIMEOUT', '900'))
+# Finished jobs (and their results) are deleted after this many seconds
+JOBS_RETENTION = float(os.getenv('PITCH_JOBS_RETENTION', str(24 * 3600)))
+# How often a running server deletes them
+JOBS_PRUNE_INTERVAL = float(os.getenv('PITCH_JOBS_PRUNE_INTERVAL', '600'))
+# How often idle runners and progress streams look for changes made by other processes
+JOBS_POLL_INTERVAL = 1.0
+
+JOB_STAGES = ('queued', 'extracting', 'analyzing', 'done')
+TERMINAL = ('done', 'failed', 'cancelled')
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail the job with this message."""
+
+class RetryLater(Exception):
+    """
+    Raised by a job handler to put the job back in the queue for `delay`
+    seconds, without using up an attempt unless count_attempt is set.
+    """
+
+    def __init__(self, delay=5.0, count_attempt=False):
+        super().__init__(f"retry in {delay}s")
+        self.delay = delay
+        self.count_attempt = count_attempt
+
+def upload_path(job_id, suffix):
+    return os.path.join(JOBS_DIR, job_id + suffix.lower())
+
+def _discard(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+class JobStore:
+    """Jobs table in a SQLite file, safe to share between threads and API processes."""
+
+    def __init__(self, path=JOBS_PATH, max_attempts=JOBS_MAX_ATTEMPTS, lease=JOBS_LEASE):
+        self.max_attempts = max_attempts
+        self.lease = lease
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, dedup_key TEXT NOT NULL, content_hash TEXT NOT NULL, "
+            "filename TEXT, suffix TEXT NOT NULL, upload_path TEXT, user_ids TEXT NOT NULL, "
+            "status TEXT NOT NULL, stage TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "run_after REAL NOT NULL DEFAULT 0, lease_until REAL, "
+            "created REAL NOT NULL, updated REAL NOT NULL, error TEXT, result BLOB)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, status)")
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-then-write
+        # steps can't interleave with another process doing the same
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def submit(self, job_id, dedup_key, content_hash, filename, suffix, path, user_id=None):
+        """
+        Queue a job for the upload at path, unless a queued, running or done
+        job already has dedup_key. Returns (job, created); when not created
+        the caller still owns path, and user_id is added to the existing job
+        if that is still queued or running.
+        """
+        now = time.time()
+        with self._lock:
+            self._transaction()
+            try:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE dedup_key = ? AND status IN ('queued', 'running', 'done') "
+                    "ORDER BY created DESC LIMIT 1", (dedup_key,)
+                ).fetchone()
+                if row is not None:
+                    user_ids = json.loads(row['user_ids'])
+                    if user_id and user_id not in user_ids and row['status'] != 'done':
+                        user_ids.append(user_id)
+                        self._db.execute("UPDATE jobs SET user_ids = ? WHERE id = ?", (json.dumps(user_ids), row['id']))
+                    job_id, created = row['id'], False
+                else:
+                    self._db.execute(
+                        "INSERT INTO jobs (id, dedup_key, content_hash, filename, suffix, upload_path, user_ids, "
+                        "status, stage, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', 'queued', ?, ?)",
+                        (job_id, dedup_key, content_hash, filename, suffix, path, json.dumps([user_id] if user_id else []), now, now),
+                    )
+                    created = True
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(job_id, with_result=False), created
+
+    def claim(self):
+        """Mark the oldest runnable job running and return it, or None. Jobs past max_attempts are failed instead."""
+        while True:
+            now = time.time()
+            with self._lock:
+                self._transaction()
+                try:
+                    row = self._db.execute(
+                        "SELECT id, attempts FROM jobs WHERE (status = 'queued' AND run_after <= ?) "
+                        "OR (status = 'running' AND lease_until < ?) ORDER BY created LIMIT 1", (now, now)
+                    ).fetchone()
+                    if row is not None and row['attempts'] >= self.max_attempts:
+                        self._db.execute(
+                            "UPDATE jobs SET status = 'failed', stage = 'failed', error = ?, lease_until = NULL, updated = ? "
+                            "WHERE id = ?", (f"Gave up after {row['attempts']} attempts", now, row['id'])
+                        )
+                    elif row is not None:
+                        self._db.execute(
+                            "UPDATE jobs SET status = 'running', stage = ?, attempts = attempts + 1, lease_until = ?, "
+                            "updated = ? WHERE id = ?", (JOB_STAGES[1], now + self.lease, now, row['id'])
+                        )
+                    self._db.execute("COMMIT")
+                except BaseException:
+                    self._db.execute("ROLLBACK")
+                    raise
+            if row is None:
+                return None
+            job = self.get(row['id'], with_result=False)
+            if job['status'] == 'running':
+                return job
+            _discard(job['upload_path'])
+
+    def _update_running(self, job_id, assignments, params):
+        """Apply assignments to a job this runner still holds; False once it was cancelled (or its lease taken)."""
+        with self._lock:
+            cursor = self._db.execute(
+                f"UPDATE jobs SET {assignments}, updated = ? WHERE id = ? AND status = 'running'",
+                (*params, time.time(), job_id),
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, job_id):
+        return self._update_running(job_id, "lease_until = ?", (time.time() + self.lease,))
+
+    def set_stage(self, job_id, stage):
+        return self._update_running(job_id, "stage = ?, lease_until = ?", (stage, time.time() + self.lease))
+
+    def finish(self, job_id, result):
+        blob = zlib.compress(json.dumps(result).encode())
+        return self._update_running(job_id, "status = 'done', stage = 'done', lease_until = NULL, result = ?", (blob,))
+
+    def fail(self, job_id, error):
+        return self._update_running(job_id, "status = 'failed', stage = 'failed', lease_until = NULL, error = ?", (error,))
+
+    def release(self, job_id, delay=0.0, count_attempt=False):
+        """Put a running job back in the queue, by default without counting the attempt."""
+        return self._update_running(
+            job_id, "status = 'queued', stage = 'queued', lease_until = NULL, attempts = attempts - ?, run_after = ?",
+            (0 if count_attempt else 1, time.time() + delay),
+        )
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job. Returns the job as it now is, or None if unknown."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'cancelled', stage = 'cancelled', lease_until = NULL, updated = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')", (time.time(), job_id)
+            )
+        return self.get(job_id, with_result=False)
+
+    def get(self, job_id, with_result=True):
+        """The job as a dict (result decoded when done and with_result), or None."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = {key: row[key] for key in row.keys() if key != 'result'}
+            job['user_ids'] = json.loads(job['user_ids'])
+            if job['status'] == 'queued':
+                job['queue_position'] = self._db.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created < ?", (row['created'],)
+                ).fetchone()[0]
+        if with_result and row['result'] is not None:
+            job['result'] = json.loads(zlib.decompress(row['result']))
+        return job
+
+    def counts(self):
+        """Number of jobs per status."""
+        with self._lock:
+            return dict(self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def prune(self, retention=JOBS_RETENTION):
+        """Delete jobs that ended more than retention seconds ago, and any upload they left; returns how many."""
+        with self._lock:
+            self._transaction()
+            try:
+                rows = self._db.execute(
+                    "SELECT id, upload_path FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated < ?",
+                    (time.time() - retention,),
+                ).fetchall()
+                self._db.executemany("DELETE FROM jobs WHERE id = ?", [(row['id'],) for row in rows])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        for row in rows:
+            _discard(row['upload_path'])
+        return len(rows)
+
+def public_view(job):
+    """What GET /jobs/{id} and the progress stream show of a job."""
+    view = {key: job[key] for key in ('id', 'status', 'stage', 'filename', 'attempts', 'created', 'updated')}
+    for key in ('queue_position', 'error', 'result'):
+        if job.get(key) is not None:
+            view[key] = job[key]
+    return view
+
+class JobRunner:
+    """
+    Runs jobs from a JobStore on the event loop, at most `concurrency` at a
+    time. handler(job, progress) is a coroutine returning the job's result;
+    await progress(stage) as it moves through JOB_STAGES. on_done(job,
+    result) is called for each job that completes.
+    """
+
+    def __init__(self, store, handler, concurrency=JOBS_CONCURRENCY, on_done=None):
+        self.store = store
+        self.handler = handler
+        self.concurrency = concurrency
+        self.on_done = on_done
+        self._tasks = []
+        self._running = {}
+        self._wake = None
+        self._changed = None
+        self._pruned = 0.0
+
+    def start(self):
+        """Start the runner tasks; call from the running event loop (e.g. the app's lifespan)."""
+        self._wake = asyncio.Event()
+        self._changed = asyncio.Event()
+        self._pruned = time.monotonic()
+        self.store.prune()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        return self
+
+    async def shutdown(self):
+        """Stop taking jobs and hand the ones in progress back to the queue for the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """A job was queued: let an idle runner claim it now rather than at its next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def _notify(self):
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def cancel(self, job_id):
+        before = self.store.get(job_id, with_result=False)
+        if before is None or before['status'] in TERMINAL:
+            return before
+        job = self.store.cancel(job_id)
+        if job_id in self._running:
+            # _run discards the upload once the handler has stopped
+            self._running[job_id].cancel()
+        elif before['status'] == 'queued':
+            _discard(job['upload_path'])
+        # (a job running in another API process stops at its next lease renewal)
+        self._notify()
+        return job
+
+    async def _work(self):
+        while True:
+            if time.monotonic() - self._pruned >= JOBS_PRUNE_INTERVAL:
+                # Finished jobs' results otherwise pile up until a restart
+                self._pruned = time.monotonic()
+                try:
+                    await asyncio.to_thread(self.store.prune)
+                except Exception:
+                    traceback.print_exc()
+            job = self.store.claim()
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), JOBS_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._notify()
+            try:
+                await self._run(job)
+            finally:
+                self._notify()
+
+    async def _run(self, job):
+        job_id = job['id']
+
+        async def progress(stage):
+            if not self.store.set_stage(job_id, stage):
+                raise asyncio.CancelledError()
+            self._notify()
+
+        task = asyncio.create_task(self.handler(job, progress))
+        self._running[job_id] = task
+        try:
+            # Renew the lease while the handler works; stop it if the job was cancelled elsewhere
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.store.lease / 3)
+                if not task.done() and not self.store.renew(job_id):
+                    task.cancel()
+            try:
+                result = task.result()
+            except asyncio.CancelledError:
+                return
+            except RetryLater as e:
+                self.store.release(job_id, e.delay, e.count_attempt)
+                return
+            except JobFailed as e:
+                self.store.fail(job_id, str(e))
+            except Exception as e:
+                traceback.print_exc()
+                self.store.fail(job_id, f"{type(e).__name__}: {e}")
+            else:
+                if self.store.finish(job_id, result) and self.on_done is not None:
+                    try:
+                        self.on_done(self.store.get(job_id, with_result=False), result)
+                    except Exception:
+                        # The job is done either way; don't let the callback take the runner down
+                        print(f"on_done failed for job {job_id}:", file=sys.stderr)
+                        traceback.print_exc()
+            _discard(job['upload_path'])
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next start picks it up
+            task.cancel()
+            self.store.release(job_id)
+            raise
+        finally:
+            self._running.pop(job_id, None)
+            if task.cancelled():
+                job_now = self.store.get(job_id, with_result=False)
+                if job_now is not None and job_now['status'] == 'cancelled':
+                    _discard(job['upload_path'])
+
+    async def watch(self, job_id, heartbeat=15.0):
+        """
+        Yields the job's public view each time its status or stage changes,
+        ending after a terminal status (whose view includes the result), and
+        None every heartbeat seconds without a change. Nothing if unknown.
+        """
+        last = None
+        quiet = 0.0
+        while True:
+            changed = self._changed
+            job = self.store.get(job_id, with_result=False)
+            if job is None:
+                return
+            state = (job['status'], job['stage'], job.get('queue_position'))
+            if state != last:
+                last, quiet = state, 0.0
+                if job['status'] in TERMINAL:
+                    yield public_view(self.store.get(job_id))
+                    return
+                yield public_view(job)
+            elif quiet >= heartbeat:
+                quiet = 0.0
+                yield None
+            # Changes made by this process wake us at once; other processes' are polled
+            try:
+                await asyncio.wait_for(changed.wait(), JOBS_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                quiet += JOBS_POLL_INTERVAL
+
+    def stats(self):
+        return {'running_here': len(self._running), 'concurrency': self.concurrency, **self.store.counts()}
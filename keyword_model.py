@@ -0,0 +1,131 @@
+# keyword_model.py
+#
+# Keyword extraction against a reference corpus. A TF-IDF vectorizer fitted
+# on pitches_data.csv is saved to keyword_vectorizer.pkl at training time, so
+# a deck's keywords are the terms that are frequent in it *and* unusual
+# across pitches, instead of simply its most frequent words. Serving only
+# loads that file; per request only term counting and a top-k selection
+# remain.
+#
+# train_model.py builds the file alongside the quality model. To rebuild just
+# the keyword model after changing the corpus:
+#     python -m keyword_model build
+
+import argparse
+import math
+import os
+import sys
+from collections import Counter
+from functools import lru_cache
+import numpy as np
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+KEYWORD_CORPUS = os.getenv('PITCH_KEYWORD_CORPUS') or os.path.join(_HERE, 'pitches_data.csv')
+KEYWORD_VECTORIZER_PATH = os.getenv('PITCH_KEYWORD_VECTORIZER_PATH') or os.path.join(_HERE, 'keyword_vectorizer.pkl')
+# Widest n-gram range the reference vocabulary covers
+MAX_NGRAM = 2
+
+def fit_keyword_vectorizer(corpus_path=KEYWORD_CORPUS, text_column='pitch_text'):
+    import pandas as pd
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from nlp_utils import preprocess_text
+    texts = pd.read_csv(corpus_path, usecols=[text_column])[text_column].dropna()
+    vectorizer = TfidfVectorizer(stop_words='english', ngram_range=(1, MAX_NGRAM), sublinear_tf=True)
+    vectorizer.fit(texts.map(preprocess_text))
+    return vectorizer
+
+@lru_cache(maxsize=None)
+def load_keyword_model():
+    """
+    Returns (idf by term, idf for terms the corpus never saw), loaded once per
+    process from KEYWORD_VECTORIZER_PATH. Never fits: a missing file is an
+    error, not a reason for every worker to re-read the corpus.
+    """
+    import joblib
+    if not os.path.exists(KEYWORD_VECTORIZER_PATH):
+        raise FileNotFoundError(
+            f"{KEYWORD_VECTORIZER_PATH} not found; build it with: python -m keyword_model build"
+        )
+    vectorizer = joblib.load(KEYWORD_VECTORIZER_PATH)
+    idf = dict(zip(vectorizer.get_feature_names_out(), vectorizer.idf_.tolist()))
+    # Unseen terms are as distinctive as the rarest corpus term
+    unseen_idf = float(vectorizer.idf_.max()) if len(idf) else 1.0
+    return idf, unseen_idf
+
+@lru_cache(maxsize=None)
+def _analyzer(ngram_range):
+    from sklearn.feature_extraction.text import CountVectorizer
+    return CountVectorizer(stop_words='english', ngram_range=ngram_range).build_analyzer()
+
+def _rank(scores, top_n):
+    """
+    Positions of the top_n scores, highest first. Positions must be in term
+    order: ties go to the alphabetically first term, also at the cut-off.
+    """
+    if len(scores) > top_n:
+        kth = -np.partition(-scores, top_n - 1)[top_n - 1]
+        above = np.flatnonzero(scores > kth)
+        top = np.concatenate([above, np.flatnonzero(scores == kth)[:top_n - len(above)]])
+    else:
+        top = np.arange(len(scores))
+    return top[np.lexsort((top, -scores[top]))]
+
+def top_keywords(text, top_n=15, ngram_range=(1, 1)):
+    """
+    The top_n terms of text by sublinear TF x corpus IDF, best first.
+    ngram_range=(1, 2) also considers two-word keyphrases.
+    """
+    counts = Counter(_analyzer(tuple(ngram_range))(text))
+    if not counts:
+        return []
+    idf, unseen_idf = load_keyword_model()
+    terms = sorted(counts)
+    scores = np.fromiter(
+        ((1.0 + math.log(counts[t])) * idf.get(t, unseen_idf) for t in terms),
+        dtype=np.float64, count=len(terms),
+    )
+    return [terms[i] for i in _rank(scores, top_n)]
+
+def top_keywords_batch(texts, top_n=15, ngram_range=(1, 1)):
+    """
+    top_keywords for many texts with one counting pass over all of them; each
+    distinct term's IDF is looked up once per batch, not once per text.
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+    # Counted over the batch's own vocabulary rather than transformed by the
+    # fitted corpus vectorizer, which would drop every term the corpus lacks
+    vectorizer = CountVectorizer(stop_words='english', ngram_range=tuple(ngram_range))
+    try:
+        counts = vectorizer.fit_transform(texts).tocsr()
+    except ValueError:  # no terms left in any text
+        return [[] for _ in texts]
+    terms = vectorizer.get_feature_names_out()
+    idf, unseen_idf = load_keyword_model()
+    weights = np.fromiter((idf.get(t, unseen_idf) for t in terms), dtype=np.float64, count=len(terms))
+    scores = counts.astype(np.float64)
+    scores.sort_indices()
+    scores.data = (1.0 + np.log(scores.data)) * weights[scores.indices]
+    keywords = []
+    for i in range(scores.shape[0]):
+        start, end = scores.indptr[i], scores.indptr[i + 1]
+        columns = scores.indices[start:end]
+        keywords.append(terms[columns[_rank(scores.data[start:end], top_n)]].tolist())
+    return keywords
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m keyword_model', description='Build the keyword IDF model.')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--corpus', default=KEYWORD_CORPUS, help='CSV with a pitch_text column (default: %(default)s)')
+    parser.add_argument('--text-column', default='pitch_text')
+    parser.add_argument('--out', default=KEYWORD_VECTORIZER_PATH)
+    args = parser.parse_args(argv)
+    import joblib
+    from nlp_resources import ensure_nltk_data
+    ensure_nltk_data()
+    vectorizer = fit_keyword_vectorizer(args.corpus, args.text_column)
+    joblib.dump(vectorizer, args.out)
+    print(f"Saved {len(vectorizer.vocabulary_)} terms to {args.out}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# metrics.py
+#
+# Lightweight stage timing and Prometheus export, with no extra dependency.
+#
+#   with timer('sentiment'):           # inside code run through collect()
+#       ...
+#   result, timings, profile = collect(fn, args)   # timings: {stage: seconds}
+#   observe_timings(timings, filetype='.pdf', size=n_bytes)
+#   render()                           # Prometheus text exposition format
+#   peak_rss_mb()                      # for scripts and benchmarks
+#
+# Histograms live in the process that calls observe_timings (the API
+# process); worker processes only collect timings and send them back.
+
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = ((100 * 1024, '100KB'), (1024 ** 2, '1MB'), (10 * 1024 ** 2, '10MB'))
+PROFILE_MODES = ('cpu', 'memory')
+
+_local = threading.local()
+
+@contextmanager
+def timer(stage, into=None):
+    """
+    Time the block as stage. Adds to into if given, else to the timings of the
+    enclosing collect() call (if any) in this thread.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = into if into is not None else getattr(_local, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+def collect(fn, args=(), profile=None):
+    """
+    Run fn(*args), recording every timer() stage inside it.
+    profile: None, 'cpu' (cProfile, top functions by cumulative time) or
+    'memory' (tracemalloc, top allocation sites).
+    Returns (result, timings, profile report text or None).
+    """
+    outer = getattr(_local, 'timings', None)
+    _local.timings = {}
+    report = None
+    try:
+        if profile == 'cpu':
+            profiler = cProfile.Profile()
+            result = profiler.runcall(fn, *args)
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(30)
+            report = out.getvalue()
+        elif profile == 'memory':
+            tracemalloc.start()
+            try:
+                result = fn(*args)
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            top = snapshot.statistics('lineno')[:30]
+            report = f"peak {peak / 1024:.1f} KiB\n" + "\n".join(str(stat) for stat in top)
+        else:
+            result = fn(*args)
+        return result, _local.timings, report
+    finally:
+        _local.timings = outer
+
+def peak_rss_mb(children=False):
+    """
+    Peak resident set size in MB of this process or, with children, of its
+    child processes that have exited. None without the resource module
+    (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def size_bucket(n_bytes):
+    for limit, label in SIZE_BUCKETS:
+        if n_bytes < limit:
+            return f"<{label}"
+    return f">={SIZE_BUCKETS[-1][1]}"
+
+class Histogram:
+    def __init__(self, name, documentation, label_names, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                labels = ','.join(f'{k}="{v}"' for k, v in zip(self.label_names, label_values))
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+                lines.append(f'{self.name}_sum{{{labels}}} {series[-2]}')
+                lines.append(f'{self.name}_count{{{labels}}} {series[-1]}')
+        return "\n".join(lines)
+
+STAGE_SECONDS = Histogram(
+    'pitch_stage_seconds', 'Time spent in each analysis stage.',
+    ('stage', 'filetype', 'size'), STAGE_BUCKETS,
+)
+
+def observe_timings(timings, filetype, size):
+    bucket = size_bucket(size)
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, stage, filetype or 'unknown', bucket)
+
+def render():
+    return STAGE_SECONDS.render() + "\n"
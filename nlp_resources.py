@@ -0,0 +1,132 @@
+# nlp_resources.py
+#
+# Process-wide NLP resources. Stopwords, the WordNet lemmatizer, VADER and
+# textstat are expensive to construct (each reloads data from disk), so they
+# are built once per process on first use and shared by every request.
+#
+# NLTK data is never downloaded at import time. It is looked up in
+# NLTK_DATA_DIR (plus NLTK's own search path); fetch it once with
+#     python -m nlp_resources prefetch
+# nltk, textstat and VADER are imported lazily so importing the API stays cheap.
+
+import argparse
+import os
+import sys
+from functools import lru_cache
+
+NLTK_DATA_DIR = os.getenv('PITCH_NLTK_DATA') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+
+# NLTK package id -> resource path checked with nltk.data.find
+NLTK_RESOURCES = {
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet',
+    'omw-1.4': 'corpora/omw-1.4',
+    'vader_lexicon': 'sentiment/vader_lexicon.zip',
+    # word_tokenize, used by the model preprocessing
+    'punkt_tab': 'tokenizers/punkt_tab',
+    # textstat counts syllables with cmudict and downloads it itself if absent
+    'cmudict': 'corpora/cmudict',
+}
+
+TEXTSTAT_LANG = 'en_US'
+
+@lru_cache(maxsize=None)
+def _nltk():
+    import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    return nltk
+
+def missing_nltk_data(resources=NLTK_RESOURCES):
+    """Return the NLTK package ids that are not installed locally."""
+    nltk = _nltk()
+    missing = []
+    for name, path in resources.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+def ensure_nltk_data(resources=NLTK_RESOURCES):
+    """Raise LookupError naming every missing NLTK package. Never downloads."""
+    missing = missing_nltk_data(resources)
+    if missing:
+        raise LookupError(
+            f"Missing NLTK data: {', '.join(missing)}. "
+            f"Run 'python -m nlp_resources prefetch' (installs into {NLTK_DATA_DIR}) "
+            "or point PITCH_NLTK_DATA / NLTK_DATA at a directory that has them."
+        )
+
+@lru_cache(maxsize=None)
+def get_stopwords():
+    _nltk()
+    from nltk.corpus import stopwords
+    return frozenset(stopwords.words('english'))
+
+@lru_cache(maxsize=None)
+def get_lemmatizer():
+    _nltk()
+    from nltk.stem import WordNetLemmatizer
+    return WordNetLemmatizer()
+
+@lru_cache(maxsize=100_000)
+def lemmatize(word):
+    return get_lemmatizer().lemmatize(word)
+
+@lru_cache(maxsize=None)
+def get_sentiment_analyzer():
+    _nltk()
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+@lru_cache(maxsize=None)
+def get_textstat():
+    import textstat
+    textstat.set_lang(TEXTSTAT_LANG)
+    return textstat
+
+def warm_up():
+    """
+    Load every resource now instead of on the first request.
+    Call once at worker startup; fails fast if NLTK data is missing.
+    """
+    ensure_nltk_data()
+    get_stopwords()
+    lemmatize('pitches')  # forces WordNet to load
+    get_sentiment_analyzer()
+    get_textstat().flesch_reading_ease('Warm up the syllable dictionary.')
+
+def prefetch(resources=NLTK_RESOURCES, download_dir=NLTK_DATA_DIR):
+    """Download any missing NLTK packages into download_dir. Returns False on failure."""
+    nltk = _nltk()
+    if download_dir not in nltk.data.path:
+        nltk.data.path.insert(0, download_dir)
+    ok = True
+    for name in missing_nltk_data(resources):
+        ok = nltk.download(name, download_dir=download_dir, quiet=True) and ok
+    return ok and not missing_nltk_data(resources)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m nlp_resources', description='Manage local NLTK data.')
+    parser.add_argument('command', choices=['prefetch', 'check'])
+    parser.add_argument('--dir', default=NLTK_DATA_DIR, help='NLTK data directory (default: %(default)s)')
+    args = parser.parse_args(argv)
+    nltk = _nltk()
+    if args.dir not in nltk.data.path:
+        nltk.data.path.insert(0, args.dir)
+    if args.command == 'prefetch':
+        if not prefetch(download_dir=args.dir):
+            print(f"Could not fetch: {', '.join(missing_nltk_data(NLTK_RESOURCES))}", file=sys.stderr)
+            return 1
+        print(f"NLTK data ready in {args.dir}")
+        return 0
+    missing = missing_nltk_data(NLTK_RESOURCES)
+    if missing:
+        print(f"Missing NLTK data: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    print("All NLTK data present.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,48 +1,67 @@
+import os
 import re
 import string
-import nltk
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from nltk.sentiment import SentimentIntensityAnalyzer
-import textstat
-
-nltk.download('stopwords')
-nltk.download('wordnet')
-nltk.download('omw-1.4')
-nltk.download('vader_lexicon')
+from bisect import bisect_right
+from functools import lru_cache
+from nlp_resources import get_stopwords, lemmatize, get_textstat
+from metrics import timer
 
 # --- Preprocessing ---
+_PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+
 def preprocess_text(text):
     text = text.lower()
     text = re.sub(r"\s+", " ", text)
-    text = text.translate(str.maketrans('', '', string.punctuation))
-    stop_words = set(stopwords.words('english'))
-    lemmatizer = WordNetLemmatizer()
+    text = text.translate(_PUNCT_TABLE)
+    stop_words = get_stopwords()
     words = text.split()
-    words = [lemmatizer.lemmatize(w) for w in words if w not in stop_words]
+    words = [lemmatize(w) for w in words if w not in stop_words]
     return ' '.join(words)
 
+# --- Model Preprocessing ---
+_DIGITS_RE = re.compile(r'\d+')
+
+def preprocess_for_model(text):
+    """
+    Preprocessing that pitch_quality_model.pkl was trained on (train_model.py
+    imports it from here). Kept separate from preprocess_text so scoring never
+    sees differently-prepared text than training did.
+    """
+    from nltk.tokenize import word_tokenize
+    text = text.lower()
+    text = _DIGITS_RE.sub('', text) # Remove numbers
+    tokens = word_tokenize(text)
+    stop_words = get_stopwords()
+    filtered_tokens = [word for word in tokens if word not in stop_words and word not in string.punctuation and word.isalpha()]
+    return " ".join(lemmatize(token) for token in filtered_tokens)
+
 # --- Keyword Extraction ---
-def extract_keywords(text, top_n=15):
-    try:
-        vectorizer = TfidfVectorizer(max_features=top_n, stop_words='english')
-        X = vectorizer.fit_transform([text])
-        keywords = vectorizer.get_feature_names_out()
-        return list(keywords)
-    except Exception:
-        return []
+def extract_keywords(text, top_n=15, ngram_range=(1, 1)):
+    """
+    Most distinctive terms of text, best first, scored against the reference
+    pitch corpus (see keyword_model). ngram_range=(1, 2) adds keyphrases.
+    """
+    from keyword_model import top_keywords
+    return top_keywords(text, top_n, ngram_range)
+
+def extract_keywords_batch(texts, top_n=15, ngram_range=(1, 1)):
+    """extract_keywords for many texts in one counting pass (same results)."""
+    from keyword_model import top_keywords_batch
+    return top_keywords_batch(texts, top_n, ngram_range)
 
 # --- Sentiment Analysis ---
 def sentiment_scores(text):
-    sia = SentimentIntensityAnalyzer()
-    scores = sia.polarity_scores(text)
-    return scores  # dict: {'neg':..., 'neu':..., 'pos':..., 'compound':...}
+    """
+    Document tone: VADER scores per sentence, averaged by word count (see
+    sentiment_model). dict: {'neg':..., 'neu':..., 'pos':..., 'compound':...}
+    """
+    from sentiment_model import sentiment_breakdown
+    return sentiment_breakdown(text)['document']
 
 # --- Readability ---
 def readability_score(text):
     try:
-        score = textstat.flesch_reading_ease(text)
+        score = get_textstat().flesch_reading_ease(text)
         return score
     except Exception:
         return None
@@ -96,24 +115,151 @@ SECTION_CRITERIA = [
     },
 ]
 
-def analyze_sections(text):
+# --- Section Keyword Matching ---
+_WORD_RE = re.compile(r"\w+")
+
+def _build_section_index(criteria):
+    # first word -> [(section index, keyword, text that must follow it)]
+    index = {}
+    for i, section in enumerate(criteria):
+        for kw in section['keywords']:
+            words = kw.lower().split()
+            tail = ''.join(' ' + w for w in words[1:])
+            index.setdefault(words[0], []).append((i, kw, tail))
+    return index
+
+_SECTION_INDEX = _build_section_index(SECTION_CRITERIA)
+
+def match_sections(text, page_starts=None):
+    """
+    Scan text once for every SECTION_CRITERIA keyword.
+    Single-word keywords match whole words; multi-word keywords start on a
+    whole word, are separated by single spaces, and their last word may run
+    on (so 'pain point' also hits 'pain points').
+    Returns one dict per section: name, found, count and hits
+    ({keyword: [character offsets into the lowercased text]}).
+    page_starts: optional [(offset, page number)] in ascending offset order
+    (see pipeline.join_pages); adds 'pages', the sorted page numbers with hits.
+    """
+    return _section_results(_section_hits(text), page_starts)
+
+def _section_hits(text):
+    # Per section: {keyword: [offsets]}
+    lowered = text.lower()
+    index = _SECTION_INDEX
+    hits = [{} for _ in SECTION_CRITERIA]
+    for tok in _WORD_RE.finditer(lowered):
+        candidates = index.get(tok.group())
+        if not candidates:
+            continue
+        for i, kw, tail in candidates:
+            if tail and not lowered.startswith(tail, tok.end()):
+                continue
+            hits[i].setdefault(kw, []).append(tok.start())
+    return hits
+
+def _section_results(hits, page_starts):
+    results = []
+    for section, section_hits in zip(SECTION_CRITERIA, hits):
+        count = sum(len(offsets) for offsets in section_hits.values())
+        result = {
+            'name': section['name'],
+            'found': count > 0,
+            'count': count,
+            'hits': section_hits,
+        }
+        if page_starts is not None:
+            result['pages'] = _pages_for_offsets(page_starts, section_hits)
+        results.append(result)
+    return results
+
+def _pages_for_offsets(page_starts, section_hits):
+    offsets = [start for start, _ in page_starts]
+    pages = set()
+    for hit_offsets in section_hits.values():
+        for offset in hit_offsets:
+            i = bisect_right(offsets, offset) - 1
+            if i >= 0:
+                pages.add(page_starts[i][1])
+    return sorted(pages)
+
+def merge_section_hits(page_hits, page_starts=None):
+    """
+    match_sections results for a whole document from per-page hits.
+    page_hits: [(offset of the page in the document, page_features(page)['hits'])].
+    """
+    hits = [{} for _ in SECTION_CRITERIA]
+    for offset, section_hits in page_hits:
+        for merged, page in zip(hits, section_hits):
+            for kw, offsets in page.items():
+                merged.setdefault(kw, []).extend(offset + o for o in offsets)
+    return _section_results(hits, page_starts)
+
+def analyze_sections(text, matches=None):
+    """
+    matches: optional result of match_sections(text), so callers that also
+    need the per-section breakdown only scan the text once.
+    """
+    if matches is None:
+        matches = match_sections(text)
     strengths = []
     weaknesses = []
     actionable_tips = []
     points = 0
-    for section in SECTION_CRITERIA:
-        found = False
-        for kw in section['keywords']:
-            # Use word boundary for single words, substring for phrases
-            if (len(kw.split()) == 1 and re.search(r'\b' + re.escape(kw) + r'\b', text, re.IGNORECASE)) or \
-               (len(kw.split()) > 1 and kw in text.lower()):
-                found = True
-                break
-        if found:
+    for section, match in zip(SECTION_CRITERIA, matches):
+        if match['found']:
             points += 1
             strengths.append(section['name'])
         else:
             weaknesses.append(section['name'])
             actionable_tips.append(section['tip'])
     score = round((points / len(SECTION_CRITERIA)) * 10, 1)
-    return score, strengths, weaknesses, actionable_tips 
\ No newline at end of file
+    return score, strengths, weaknesses, actionable_tips
+
+# --- Per-page intermediates ---
+PAGE_CACHE_ENABLED = os.getenv('PITCH_PAGE_CACHE', '1') != '0'
+PAGE_CACHE_MEMORY_ITEMS = int(os.getenv('PITCH_PAGE_CACHE_MEMORY_ITEMS', '2048'))
+
+def page_features(text):
+    """
+    Everything about one page/slide that a whole-deck analysis merges
+    (see pipeline.analyze_texts): preprocess_text and preprocess_for_model
+    output, section keyword hits and sentence sentiment, with offsets
+    relative to the page.
+    """
+    from sentiment_model import text_sentences
+    with timer('preprocess'):
+        tokens = preprocess_text(text)
+    with timer('model_preprocess'):
+        model_tokens = preprocess_for_model(text)
+    with timer('sections'):
+        hits = _section_hits(text)
+    with timer('sentiment'):
+        sentences = text_sentences(text)
+    return {'tokens': tokens, 'model_tokens': model_tokens, 'hits': hits, 'sentences': sentences}
+
+@lru_cache(maxsize=None)
+def _page_cache():
+    # Shares the analysis cache's SQLite file (as 'page:' entries) so every
+    # worker process sees pages the others computed
+    from analysis_cache import AnalysisCache, CACHE_PATH
+    if not PAGE_CACHE_ENABLED:
+        return AnalysisCache(path=None, memory_items=0)
+    return AnalysisCache(CACHE_PATH, memory_items=PAGE_CACHE_MEMORY_ITEMS)
+
+def cached_page_features(pages):
+    """
+    page_features for each (fingerprint, page text), reusing the result for
+    any page seen before, e.g. the unchanged slides of a revised deck.
+    """
+    from analysis_cache import page_key
+    cache = _page_cache()
+    results = []
+    for fingerprint, text in pages:
+        key = page_key(fingerprint)
+        features = cache.get(key)
+        if features is None:
+            features = page_features(text)
+            cache.put(key, features)
+        results.append(features)
+    return results
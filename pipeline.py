@@ -0,0 +1,189 @@
+# pipeline.py
+#
+# The analysis behind /analyze, kept free of FastAPI so it can also run in
+# worker processes, batch jobs and caches.
+#
+# Decks are analyzed page by page: each page's intermediates are cached by
+# content (nlp_utils.cached_page_features) and merged into the deck result,
+# so re-uploading a revised deck only recomputes the slides that changed.
+
+import difflib
+from nlp_utils import extract_keywords_batch, readability_score, analyze_sections, merge_section_hits, cached_page_features, SECTION_CRITERIA
+from pitch_model import score_preprocessed
+from text_extractor import extract_pages, join_pages, split_pages, page_fingerprint
+from sentiment_model import breakdown_from_sentences
+from similarity_index import minhash, shingles
+from metrics import timer
+
+def extract_upload(source, suffix):
+    """
+    Page chunks [(page number, text)] of an upload given as bytes or a spooled
+    file path, and its extension (e.g. '.pdf'). Join with join_pages.
+    """
+    return extract_pages(source, suffix.lower())
+
+def analyze_files(paths):
+    """
+    Extract and analyze a batch of deck files in one go.
+    Returns (path, result) pairs in input order.
+    """
+    texts, page_starts_list = [], []
+    for path in paths:
+        text, page_starts = join_pages(extract_pages(path))
+        texts.append(text)
+        page_starts_list.append(page_starts)
+    return list(zip(paths, analyze_texts(texts, page_starts_list)))
+
+def analyze_text(text, page_starts=None):
+    """
+    Full analysis result for extracted deck text (the /analyze response body).
+    page_starts: from join_pages; lets each section report the pages it was found on.
+    """
+    return analyze_texts([text], [page_starts])[0]
+
+def analyze_text_with_signature(text, page_starts=None):
+    """
+    (analyze_text result, similarity_index MinHash signature or None). The
+    signature is only for indexing, so it is kept out of the result.
+    """
+    return _analyze([text], [page_starts], signatures=True)[0]
+
+def analyze_texts(texts, page_starts_list=None):
+    """
+    analyze_text for many documents. Model scoring runs once over the whole
+    batch instead of once per document.
+    """
+    return [result for result, _ in _analyze(texts, page_starts_list)]
+
+def _analyze(texts, page_starts_list=None, signatures=False):
+    if page_starts_list is None:
+        page_starts_list = [None] * len(texts)
+    pages_list, features_list = [], []
+    for text, page_starts in zip(texts, page_starts_list):
+        pages = [(offset, number, page_fingerprint(page), page) for offset, number, page in split_pages(text, page_starts)]
+        pages_list.append(pages)
+        features_list.append(cached_page_features([(fingerprint, page) for _, _, fingerprint, page in pages]))
+    with timer('keywords'):
+        keywords_list = extract_keywords_batch([_joined(features, 'tokens') for features in features_list])
+    with timer('model_score'):
+        quality_scores = score_preprocessed([_joined(features, 'model_tokens') for features in features_list])
+    results = [_analysis_result(*args) for args in zip(texts, page_starts_list, pages_list, features_list, keywords_list, quality_scores)]
+    if not signatures:
+        return [(result, None) for result in results]
+    with timer('signature'):
+        # The similar-pitch index's MinHash, from the tokens already at hand
+        return [(result, minhash(shingles(_joined(features, 'tokens')))) for result, features in zip(results, features_list)]
+
+# (minimum section_score, maturity_level, investor_feedback), highest first
+MATURITY_LEVELS = [
+    (8, 'Series A Ready', 'Impressive! Your pitch covers all key areas investors look for.'),
+    (6, 'Seed Ready', 'Good job! Strengthen your business model and traction sections for more impact.'),
+    (4, 'Pre-seed Ready', 'You have the basics. Clarify your problem, solution, and market size for investors.'),
+    (0, 'Beginner', 'Your pitch is missing several key sections. Focus on clearly stating the problem, solution, and team.'),
+]
+
+def maturity_for(section_score):
+    """(maturity_level, investor_feedback) for a 0-10 section score."""
+    for minimum, maturity, feedback in MATURITY_LEVELS:
+        if section_score >= minimum:
+            return maturity, feedback
+    return MATURITY_LEVELS[-1][1:]
+
+def _joined(features, field):
+    return " ".join(f[field] for f in features if f[field])
+
+def _analysis_result(text, page_starts, pages, features, keywords, quality_score):
+    with timer('sections'):
+        section_matches = merge_section_hits([(offset, f['hits']) for (offset, _, _, _), f in zip(pages, features)], page_starts)
+        section_score, strengths, weaknesses, tips = analyze_sections(text, section_matches)
+    with timer('sentiment'):
+        sentences = [[offset + start, offset + end, words, scores]
+                     for (offset, _, _, _), f in zip(pages, features) for start, end, words, scores in f['sentences']]
+        tone = breakdown_from_sentences(sentences, page_starts, section_matches)
+    with timer('readability'):
+        readability = readability_score(text)
+
+    # Generate investor feedback and maturity level (simple logic for now)
+    maturity, investor_feedback = maturity_for(section_score)
+
+    # Section-wise breakdown
+    section_breakdown = []
+    for section, match, section_tone in zip(SECTION_CRITERIA, section_matches, tone['sections']):
+        found = match['found']
+        strength = 5 if found else 2
+        missing = [] if found else [f"Missing: {section['name']}"]
+        suggestion = section['tip']
+        section_breakdown.append({
+            'name': section['name'],
+            'strength': strength,
+            'missing': missing,
+            'suggestion': suggestion,
+            'hits': match['count'],
+            'pages': match.get('pages', []),
+            'sentiment': section_tone
+        })
+
+    return {
+        "keywords": keywords,
+        "sentiment": tone['document'],
+        "sentiment_by_page": tone.get('pages', []),
+        "readability": readability,
+        "section_score": section_score,
+        "strengths": strengths,
+        "weaknesses": weaknesses,
+        "tips": tips,
+        "raw_text": text,
+        "investor_feedback": investor_feedback,
+        "maturity_level": maturity,
+        "quality_score": quality_score,
+        "sections": section_breakdown,
+        "page_count": len(page_starts) if page_starts is not None else None,
+        "page_fingerprints": [{'page': number, 'fingerprint': fingerprint} for _, number, fingerprint, _ in pages]
+                             if page_starts is not None else []
+    }
+
+def diff_results(base, revised):
+    """
+    What changed between two analyses of versions of a deck: score deltas,
+    sections gained or lost, and which slides were added, removed or edited
+    (matched by page fingerprint, so moved slides count as unchanged).
+    """
+    def delta(key):
+        if base.get(key) is None or revised.get(key) is None:
+            return None
+        return round(revised[key] - base[key], 2)
+
+    base_sections = {s['name']: s for s in base['sections']}
+    revised_sections = {s['name']: s for s in revised['sections']}
+    base_found = {name for name, s in base_sections.items() if s['hits']}
+    revised_found = {name for name, s in revised_sections.items() if s['hits']}
+    section_changes = [
+        {'name': name, 'base_hits': base_sections[name]['hits'], 'revised_hits': revised_sections[name]['hits']}
+        for name in revised_sections
+        if name in base_sections and base_sections[name]['hits'] != revised_sections[name]['hits']
+    ]
+
+    base_pages = base.get('page_fingerprints', [])
+    revised_pages = revised.get('page_fingerprints', [])
+    matcher = difflib.SequenceMatcher(None, [p['fingerprint'] for p in base_pages],
+                                      [p['fingerprint'] for p in revised_pages], autojunk=False)
+    slide_changes = []
+    unchanged = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            unchanged += i2 - i1
+            continue
+        slide_changes.append({
+            'change': {'replace': 'modified', 'delete': 'removed', 'insert': 'added'}[tag],
+            'base_pages': [p['page'] for p in base_pages[i1:i2]],
+            'revised_pages': [p['page'] for p in revised_pages[j1:j2]],
+        })
+    return {
+        'score_delta': {key: delta(key) for key in ('section_score', 'quality_score', 'readability')},
+        'sentiment_delta': round(revised['sentiment']['compound'] - base['sentiment']['compound'], 4),
+        'maturity_level': {'base': base['maturity_level'], 'revised': revised['maturity_level']},
+        'sections_gained': [name for name in revised_sections if name in revised_found - base_found],
+        'sections_lost': [name for name in base_sections if name in base_found - revised_found],
+        'section_changes': section_changes,
+        'slides': {'unchanged': unchanged, 'changes': slide_changes},
+    }
@@ -0,0 +1,56 @@
+# pitch_model.py
+#
+# Serves the model trained by train_model.py. The vectorizer and forest are
+# loaded once per process; scoring many pitches vectorizes them into one
+# sparse matrix and runs a single predict call. When the compact export of
+# the forest (see compact_forest) exists and was made from MODEL_PATH, it is
+# memory-mapped instead of unpickling the trees.
+
+import os
+from functools import lru_cache
+from nlp_utils import preprocess_for_model
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.getenv('PITCH_MODEL_PATH') or os.path.join(_HERE, 'pitch_quality_model.pkl')
+VECTORIZER_PATH = os.getenv('PITCH_VECTORIZER_PATH') or os.path.join(_HERE, 'tfidf_vectorizer.pkl')
+COMPACT_MODEL_PATH = os.getenv('PITCH_COMPACT_MODEL_PATH') or os.path.join(_HERE, 'pitch_quality_model.npz')
+
+def _load_compact():
+    """The compact forest, or None if there is none or it was exported from a different MODEL_PATH."""
+    if not os.path.exists(COMPACT_MODEL_PATH):
+        return None
+    from compact_forest import load_compact, file_sha256
+    forest = load_compact(COMPACT_MODEL_PATH)
+    if os.path.exists(MODEL_PATH) and forest.source_sha256 != file_sha256(MODEL_PATH):
+        return None
+    return forest
+
+@lru_cache(maxsize=None)
+def load_model():
+    """
+    Returns (vectorizer, model), loaded once per process.
+    mmap_mode='r' memory-maps the numpy arrays joblib stored separately so
+    workers forked from the same parent share those pages; the compact
+    forest is memory-mapped whole.
+    """
+    import joblib
+    vectorizer = joblib.load(VECTORIZER_PATH, mmap_mode='r')
+    model = _load_compact()
+    if model is None:
+        model = joblib.load(MODEL_PATH, mmap_mode='r')
+    return vectorizer, model
+
+def score_texts(texts):
+    """Predicted quality score (training scale) for each text, in order."""
+    return score_preprocessed([preprocess_for_model(t) for t in texts])
+
+def score_preprocessed(texts):
+    """score_texts for texts already run through preprocess_for_model."""
+    if not texts:
+        return []
+    vectorizer, model = load_model()
+    X = vectorizer.transform(texts)
+    return [round(float(s), 2) for s in model.predict(X)]
+
+def score_text(text):
+    return score_texts([text])[0]
@@ -0,0 +1,140 @@
+# sentiment_model.py
+#
+# Sentence-level VADER sentiment. Scoring a whole deck as one string is slow
+# (VADER's cost grows faster than linearly with text length) and its single
+# compound saturates near +/-1 on long text. Here the text is split into
+# sentences (and slide lines), each is scored once, and scores are averaged,
+# weighted by word count, per document, per page and per SECTION_CRITERIA
+# section.
+#
+# Repeated sentences (footers, disclaimers, template boilerplate) are scored
+# once per process. Large decks can be scored on a process pool by setting
+# PITCH_SENTIMENT_WORKERS; by default scoring stays in-process, which is what
+# the API's own analysis workers want.
+
+import multiprocessing
+import os
+import re
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from nlp_resources import get_sentiment_analyzer
+
+SENTIMENT_WORKERS = int(os.getenv('PITCH_SENTIMENT_WORKERS', '0'))
+# Fewer uncached sentences than this are scored in-process even with workers
+PARALLEL_MIN_SENTENCES = 2000
+SENTENCES_PER_TASK = 500
+MEMO_SIZE = 100_000
+
+SCORE_KEYS = ('neg', 'neu', 'pos', 'compound')
+NEUTRAL = {'neg': 0.0, 'neu': 1.0, 'pos': 0.0, 'compound': 0.0}
+
+# Sentence ends (., !, ? then whitespace) and line/page breaks, which end slide bullets
+_BOUNDARY_RE = re.compile(r"(?<=[.!?])\s+|\s*[\n\f]\s*")
+_WORDISH_RE = re.compile(r"\w")
+
+_memo = {}
+
+def sentence_spans(text):
+    """(start, end) offsets of each sentence or line of text that contains a word character."""
+    spans = []
+    start = 0
+    for boundary in _BOUNDARY_RE.finditer(text):
+        if _WORDISH_RE.search(text, start, boundary.start()):
+            spans.append((start, boundary.start()))
+        start = boundary.end()
+    if _WORDISH_RE.search(text, start):
+        spans.append((start, len(text.rstrip())))
+    return spans
+
+def _score_batch(sentences):
+    sia = get_sentiment_analyzer()
+    return [sia.polarity_scores(sentence) for sentence in sentences]
+
+def _init_worker():
+    get_sentiment_analyzer()
+
+_executor = None
+
+def _score_parallel(sentences, workers):
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=_init_worker)
+    chunks = [sentences[i:i + SENTENCES_PER_TASK] for i in range(0, len(sentences), SENTENCES_PER_TASK)]
+    scores = []
+    for chunk_scores in _executor.map(_score_batch, chunks):
+        scores.extend(chunk_scores)
+    return scores
+
+def score_sentences(sentences, workers=SENTIMENT_WORKERS):
+    """VADER polarity_scores for each sentence. Each distinct sentence is scored at most once per process."""
+    known, todo = {}, []
+    for sentence in dict.fromkeys(sentences):
+        cached = _memo.get(sentence)
+        if cached is None:
+            todo.append(sentence)
+        else:
+            known[sentence] = cached
+    if todo:
+        if workers > 0 and len(todo) >= PARALLEL_MIN_SENTENCES:
+            fresh = _score_parallel(todo, workers)
+        else:
+            fresh = _score_batch(todo)
+        known.update(zip(todo, fresh))
+        if len(_memo) + len(todo) > MEMO_SIZE:
+            _memo.clear()
+        _memo.update(zip(todo, fresh))
+    return [known[sentence] for sentence in sentences]
+
+def aggregate(scores, weights):
+    """Weighted mean of polarity score dicts, rounded like VADER's own output."""
+    total = sum(weights)
+    if not total:
+        return dict(NEUTRAL)
+    return {key: round(sum(s[key] * w for s, w in zip(scores, weights)) / total, 4) for key in SCORE_KEYS}
+
+def text_sentences(text, workers=SENTIMENT_WORKERS):
+    """[start, end, word count, scores] for each sentence of text; the unit that breakdown_from_sentences aggregates."""
+    spans = sentence_spans(text)
+    sentences = [" ".join(text[start:end].split()) for start, end in spans]
+    scores = score_sentences(sentences, workers)
+    return [[start, end, len(sentence.split()), score] for (start, end), sentence, score in zip(spans, sentences, scores)]
+
+def sentiment_breakdown(text, page_starts=None, section_matches=None, workers=SENTIMENT_WORKERS):
+    """breakdown_from_sentences over all of text."""
+    return breakdown_from_sentences(text_sentences(text, workers), page_starts, section_matches)
+
+def breakdown_from_sentences(sentences, page_starts=None, section_matches=None):
+    """
+    Returns {'document': scores, 'pages': [...], 'sections': [...]}.
+    sentences: from text_sentences, in text order (offsets into the whole text).
+    page_starts (from join_pages) adds one {'page', 'sentences', **scores}
+    entry per page; section_matches (from match_sections) adds one entry per
+    section, aggregated over the sentences holding its keyword hits, or None
+    for a section with no hits.
+    """
+    starts = [start for start, _, _, _ in sentences]
+    weights = [words for _, _, words, _ in sentences]
+    scores = [score for _, _, _, score in sentences]
+    breakdown = {'document': aggregate(scores, weights)}
+
+    def group(indices):
+        indices = sorted(indices)
+        return {'sentences': len(indices), **aggregate([scores[i] for i in indices], [weights[i] for i in indices])}
+
+    if page_starts is not None:
+        offsets = [offset for offset, _ in page_starts]
+        by_page = {}
+        for i, start in enumerate(starts):
+            page_index = bisect_right(offsets, start) - 1
+            if page_index >= 0:
+                by_page.setdefault(page_starts[page_index][1], []).append(i)
+        breakdown['pages'] = [{'page': page, **group(indices)} for page, indices in sorted(by_page.items())]
+    if section_matches is not None:
+        sections = []
+        for match in section_matches:
+            indices = {bisect_right(starts, offset) - 1 for offsets in match['hits'].values() for offset in offsets}
+            indices.discard(-1)
+            sections.append({'name': match['name'], **group(indices)} if indices else None)
+        breakdown['sections'] = sections
+    return breakdown
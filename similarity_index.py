@@ -0,0 +1,493 @@
+# similarity_index.py
+#
+# "Pitches like yours" and near-duplicate resubmissions. Each deck becomes a
+# MinHash signature of the word unigrams and bigrams of its preprocess_text
+# output: NUM_PERM values whose rate of agreement between two decks
+# estimates the Jaccard similarity of their term sets. Signatures are
+# indexed with LSH: BANDS bands of ROWS values each, and two decks are
+# candidates when any band matches exactly (with 40 bands of 3, most pairs
+# above ~0.3 similarity and few below). Candidates are then ranked by
+# estimated similarity.
+#
+# On disk, in SIMILARITY_DIR:
+#   docs.sqlite3            every indexed deck: id, source, label, owner, signature
+#   signatures-<gen>.npy    N x NUM_PERM uint32; row i is doc idx i
+#   band_keys-<gen>.npy     BANDS x N uint64, each band's keys sorted
+#   band_docs-<gen>.npy     BANDS x N uint32, doc idx of each sorted key
+#   manifest.json           generation, N and the parameters used
+# The arrays are memory-mapped and probed with np.searchsorted, so a query
+# costs O(BANDS log N) plus its candidates. Decks added since the last
+# compaction live in an in-memory delta (reloaded from docs.sqlite3 on
+# open); every COMPACT_EVERY additions a background thread merges it into a
+# new generation of arrays, swapped in by rewriting the manifest.
+#
+# Several processes may write to one index: SQLite assigns each deck's idx,
+# every write first picks up decks other processes added, and compactions
+# take compact.lock and start from the newest manifest.
+#
+#     python -m similarity_index build          # pitches_data.csv + saved history
+#     python -m similarity_index query deck.pdf
+#     python -m similarity_index stats
+
+import argparse
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+try:
+    import fcntl
+except ImportError:  # Windows: compactions aren't serialized across processes
+    fcntl = None
+import numpy as np
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+SIMILARITY_DIR = os.getenv('PITCH_SIMILARITY_DIR') or os.path.join(_HERE, '.cache', 'similarity')
+COMPACT_EVERY = int(os.getenv('PITCH_SIMILARITY_COMPACT_EVERY', '10000'))
+# Similarity at or above which a hit is flagged as a near-duplicate
+NEAR_DUPLICATE = float(os.getenv('PITCH_NEAR_DUPLICATE', '0.9'))
+
+NUM_PERM = 120
+BANDS = 40
+ROWS = NUM_PERM // BANDS
+SEED = 1
+# Each band bucket contributes at most this many candidates, so a bucket
+# full of boilerplate decks can't turn a query into a scan
+MAX_BUCKET = 1000
+SHINGLE_BLOCK = 4096
+
+_MERSENNE = (1 << 31) - 1
+_BAND_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+_SIGNATURE_DTYPE = np.dtype('<u4')
+
+@lru_cache(maxsize=None)
+def _permutations():
+    rng = np.random.default_rng(SEED)
+    a = rng.integers(1, _MERSENNE, NUM_PERM, dtype=np.uint64)
+    b = rng.integers(0, _MERSENNE, NUM_PERM, dtype=np.uint64)
+    return a[:, None], b[:, None]
+
+def shingles(tokens):
+    """Word unigrams and bigrams of preprocess_text output."""
+    words = tokens.split()
+    return set(words).union(f"{first} {second}" for first, second in zip(words, words[1:]))
+
+def minhash(terms):
+    """NUM_PERM uint32 MinHash signature of a set of strings; None when it is empty."""
+    if not terms:
+        return None
+    x = np.fromiter((zlib.crc32(term.encode('utf-8', errors='surrogatepass')) for term in terms),
+                    dtype=np.uint64, count=len(terms)) % _MERSENNE
+    a, b = _permutations()
+    signature = np.full(NUM_PERM, _MERSENNE, dtype=np.uint64)
+    for start in range(0, len(x), SHINGLE_BLOCK):
+        # a and x are below 2**31, so (a * x + b) can't overflow uint64
+        block = (a * x[None, start:start + SHINGLE_BLOCK] + b) % _MERSENNE
+        np.minimum(signature, block.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+def text_signature(text):
+    """minhash of the deck text's preprocess_text terms; None for text without any."""
+    from nlp_utils import preprocess_text
+    return minhash(shingles(preprocess_text(text)))
+
+def band_keys(signatures):
+    """(n, BANDS) uint64 key of each band of each (n, NUM_PERM) signature row."""
+    bands = np.asarray(signatures, dtype=np.uint64).reshape(len(signatures), BANDS, ROWS)
+    keys = np.zeros((len(signatures), BANDS), dtype=np.uint64)
+    for row in range(ROWS):
+        # Wrapping uint64 arithmetic is the point here
+        keys = keys * _BAND_MULTIPLIER + bands[:, :, row]
+    return keys
+
+def _empty_arrays():
+    return {'signatures': np.zeros((0, NUM_PERM), dtype=np.uint32),
+            'band_keys': np.zeros((BANDS, 0), dtype=np.uint64),
+            'band_docs': np.zeros((BANDS, 0), dtype=np.uint32)}
+
+class SimilarityIndex:
+    """MinHash LSH index of decks in directory; see the module comment for the layout."""
+
+    def __init__(self, directory=SIMILARITY_DIR, compact_every=COMPACT_EVERY):
+        self.directory = directory
+        self.compact_every = compact_every
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = self._connect()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs (idx INTEGER PRIMARY KEY, doc_id TEXT NOT NULL UNIQUE, "
+            "source TEXT NOT NULL, label TEXT, user_id TEXT, signature BLOB NOT NULL, added REAL NOT NULL)"
+        )
+        self._compaction = None
+        self._load()
+
+    def _connect(self):
+        db = sqlite3.connect(os.path.join(self.directory, 'docs.sqlite3'), check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _path(self, name, generation):
+        return os.path.join(self.directory, f'{name}-{generation}.npy')
+
+    def _read_manifest(self):
+        try:
+            with open(os.path.join(self.directory, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (manifest.get('num_perm'), manifest.get('bands'), manifest.get('seed')) != (NUM_PERM, BANDS, SEED):
+            # Built with other parameters: start over from docs.sqlite3
+            return None
+        return manifest
+
+    def _load(self):
+        """Map the current generation's arrays and rebuild the delta from docs.sqlite3."""
+        manifest = self._read_manifest()
+        arrays = _empty_arrays()
+        if manifest is not None and manifest['count']:
+            arrays = {name: np.load(self._path(name, manifest['generation']), mmap_mode='r') for name in arrays}
+        with self._lock:
+            self.generation = manifest['generation'] if manifest else 0
+            self.count = manifest['count'] if manifest else 0
+            self._arrays = arrays
+            self._reset_delta(self.count)
+
+    def _reset_delta(self, start):
+        self._delta_idx = []
+        self._delta_signatures = []
+        self._delta_buckets = [{} for _ in range(BANDS)]
+        self._next_idx = start
+        self._catch_up(True)
+
+    def _catch_up(self, searchable):
+        """Take in decks added since _next_idx, by this process or another."""
+        rows = self._db.execute("SELECT idx, signature FROM docs WHERE idx >= ? ORDER BY idx", (self._next_idx,))
+        for idx, blob in rows:
+            if searchable:
+                self._add_to_delta(idx, np.frombuffer(blob, dtype=_SIGNATURE_DTYPE))
+            self._next_idx = idx + 1
+
+    def _add_to_delta(self, idx, signature):
+        self._delta_idx.append(idx)
+        self._delta_signatures.append(signature)
+        for band, key in enumerate(band_keys(signature[None])[0].tolist()):
+            self._delta_buckets[band].setdefault(key, []).append(idx)
+
+    def __len__(self):
+        return self._next_idx
+
+    def contains(self, doc_id):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM docs WHERE doc_id = ?", (doc_id,)).fetchone() is not None
+
+    def signature(self, doc_id):
+        """The stored signature of doc_id, or None if it isn't indexed."""
+        with self._lock:
+            row = self._db.execute("SELECT signature FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+        return None if row is None else np.frombuffer(row[0], dtype=_SIGNATURE_DTYPE)
+
+    def add(self, doc_id, signature, source, label=None, user_id=None):
+        """Index one deck; False if doc_id is already indexed or the signature is None."""
+        return self.add_many([(doc_id, signature, source, label, user_id)]) == 1
+
+    def add_many(self, docs, searchable_now=True):
+        """
+        Index (doc_id, signature, source, label, user_id) tuples, skipping
+        doc_ids already present and None signatures. Returns how many were
+        added. searchable_now=False only writes them to docs.sqlite3 (for
+        bulk loads that call compact() at the end).
+        """
+        added = 0
+        with self._lock:
+            # IMMEDIATE: no other writer can insert between the catch-up and ours
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._catch_up(searchable_now)
+                for doc_id, signature, source, label, user_id in docs:
+                    if signature is None:
+                        continue
+                    signature = np.ascontiguousarray(signature, dtype=_SIGNATURE_DTYPE)
+                    # SQLite assigns idx, one past the largest (from 0, so the arrays stay dense)
+                    cursor = self._db.execute(
+                        "INSERT OR IGNORE INTO docs (idx, doc_id, source, label, user_id, signature, added) "
+                        "VALUES ((SELECT COALESCE(MAX(idx) + 1, 0) FROM docs), ?, ?, ?, ?, ?, ?)",
+                        (doc_id, source, label, user_id, signature.tobytes(), time.time()),
+                    )
+                    if cursor.rowcount:
+                        if searchable_now:
+                            self._add_to_delta(cursor.lastrowid, signature)
+                        self._next_idx = cursor.lastrowid + 1
+                        added += 1
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                self._load()
+                raise
+            if searchable_now and len(self._delta_idx) >= self.compact_every and self._compaction is None:
+                self._compaction = threading.Thread(target=self._compact_in_background, name='similarity-compact', daemon=True)
+                self._compaction.start()
+        return added
+
+    def _compact_in_background(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Similarity index compaction failed: {e}", file=sys.stderr)
+        finally:
+            self._compaction = None
+
+    @contextlib.contextmanager
+    def _compaction_lock(self):
+        with open(os.path.join(self.directory, 'compact.lock'), 'w') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+
+    def compact(self):
+        """Merge every doc added since the last compaction into a new generation of arrays."""
+        with self._compaction_lock():
+            manifest = self._read_manifest()
+            if manifest is not None and manifest['generation'] > self.generation:
+                # Another process compacted since we loaded; build on its generation
+                self._load()
+            with self._lock:
+                self._catch_up(True)
+                old, start, stop = self._arrays, self.count, self._next_idx
+                generation = self.generation + 1
+            if stop == start:
+                return 0
+            return self._write_generation(old, start, stop, generation)
+
+    def _write_generation(self, old, start, stop, generation):
+        # Its own connection: the API keeps adding and querying meanwhile
+        db = self._connect()
+        try:
+            signatures = np.lib.format.open_memmap(self._path('signatures', generation), mode='w+',
+                                                   dtype=np.uint32, shape=(stop, NUM_PERM))
+            signatures[:start] = old['signatures']
+            for offset in range(start, stop, 100_000):
+                rows = db.execute("SELECT idx, signature FROM docs WHERE idx >= ? AND idx < ? ORDER BY idx",
+                                  (offset, min(offset + 100_000, stop))).fetchall()
+                signatures[[idx for idx, _ in rows]] = np.frombuffer(b''.join(blob for _, blob in rows),
+                                                                     dtype=_SIGNATURE_DTYPE).reshape(len(rows), NUM_PERM)
+            signatures.flush()
+        finally:
+            db.close()
+        new_keys = np.empty((stop - start, BANDS), dtype=np.uint64)
+        for offset in range(start, stop, 100_000):
+            block = slice(offset, min(offset + 100_000, stop))
+            new_keys[block.start - start:block.stop - start] = band_keys(signatures[block])
+        keys_out = np.lib.format.open_memmap(self._path('band_keys', generation), mode='w+', dtype=np.uint64, shape=(BANDS, stop))
+        docs_out = np.lib.format.open_memmap(self._path('band_docs', generation), mode='w+', dtype=np.uint32, shape=(BANDS, stop))
+        new_docs = np.arange(start, stop, dtype=np.uint32)
+        for band in range(BANDS):
+            keys = np.concatenate([old['band_keys'][band], new_keys[:, band]])
+            docs = np.concatenate([old['band_docs'][band], new_docs])
+            order = np.argsort(keys, kind='stable')
+            keys_out[band] = keys[order]
+            docs_out[band] = docs[order]
+        keys_out.flush()
+        docs_out.flush()
+        del signatures, keys_out, docs_out
+        manifest = {'generation': generation, 'count': stop, 'num_perm': NUM_PERM, 'bands': BANDS, 'seed': SEED}
+        tmp = os.path.join(self.directory, 'manifest.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, os.path.join(self.directory, 'manifest.json'))
+        with self._lock:
+            self.generation, self.count = generation, stop
+            self._arrays = {name: np.load(self._path(name, generation), mmap_mode='r') for name in _empty_arrays()}
+            # Keep only what was added while this compaction ran
+            self._reset_delta(stop)
+        # Open maps of older generations stay valid after the unlink
+        for path in glob.glob(os.path.join(self.directory, '*-*.npy')):
+            if not path.endswith(f'-{generation}.npy'):
+                os.remove(path)
+        return stop - start
+
+    def _candidates(self, signature):
+        keys = band_keys(signature[None])[0]
+        with self._lock:
+            arrays, count = self._arrays, self.count
+            delta_idx = list(self._delta_idx)
+            delta_signatures = list(self._delta_signatures)
+            delta_hits = {idx for band, key in enumerate(keys.tolist()) for idx in self._delta_buckets[band].get(key, ())}
+        found = []
+        for band in range(BANDS):
+            sorted_keys = arrays['band_keys'][band]
+            lo = np.searchsorted(sorted_keys, keys[band], side='left')
+            hi = np.searchsorted(sorted_keys, keys[band], side='right')
+            if hi > lo:
+                found.append(np.asarray(arrays['band_docs'][band][lo:min(hi, lo + MAX_BUCKET)]))
+        indexed = np.unique(np.concatenate(found)).astype(np.int64) if found else np.zeros(0, dtype=np.int64)
+        position = {idx: i for i, idx in enumerate(delta_idx)}
+        fresh = sorted(delta_hits)
+        idx = np.concatenate([indexed, np.asarray(fresh, dtype=np.int64)])
+        rows = [np.asarray(arrays['signatures'][indexed])] if len(indexed) else []
+        if fresh:
+            rows.append(np.stack([delta_signatures[position[i]] for i in fresh]))
+        matrix = np.concatenate(rows) if rows else np.zeros((0, NUM_PERM), dtype=np.uint32)
+        return idx, matrix
+
+    def query(self, signature, k=10, min_similarity=0.0, exclude=None):
+        """
+        Up to k most similar indexed decks, best first:
+        [{'doc_id', 'source', 'label', 'user_id', 'similarity'}]. exclude: a doc_id to leave out.
+        """
+        if signature is None:
+            return []
+        signature = np.asarray(signature, dtype=np.uint32)
+        idx, matrix = self._candidates(signature)
+        if not len(idx):
+            return []
+        similarity = (matrix == signature).mean(axis=1)
+        keep = similarity >= min_similarity
+        idx, similarity = idx[keep], similarity[keep]
+        # One spare, in case the excluded doc is among the best
+        top = min(k + 1, len(idx))
+        best = np.argpartition(-similarity, top - 1)[:top] if len(idx) > top else np.arange(len(idx))
+        best = sorted(best.tolist(), key=lambda i: (-similarity[i], idx[i]))
+        chosen = [int(idx[i]) for i in best]
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT idx, doc_id, source, label, user_id FROM docs WHERE idx IN ({','.join('?' * len(chosen))})", chosen
+            ).fetchall()
+        meta = {row[0]: row[1:] for row in rows}
+        hits = []
+        for i in best:
+            doc_id, source, label, user_id = meta[int(idx[i])]
+            if doc_id != exclude:
+                hits.append({'doc_id': doc_id, 'source': source, 'label': label, 'user_id': user_id,
+                             'similarity': round(float(similarity[i]), 4)})
+        return hits[:k]
+
+    def stats(self):
+        with self._lock:
+            sources = dict(self._db.execute("SELECT source, COUNT(*) FROM docs GROUP BY source").fetchall())
+            return {'docs': self._next_idx, 'compacted': self.count, 'delta': len(self._delta_idx),
+                    'generation': self.generation, 'sources': sources}
+
+# --- Bulk build ---
+
+def _init_worker():
+    from nlp_resources import warm_up
+    warm_up()
+
+def _signature_batch(texts):
+    return [text_signature(text) for text in texts]
+
+def _corpus_docs(path, chunksize):
+    """(doc_id, text, label) per pitch in the training CSV."""
+    import hashlib
+    import pandas as pd
+    for chunk in pd.read_csv(path, usecols=['pitch_text'], chunksize=chunksize):
+        for text in chunk['pitch_text'].dropna().astype(str):
+            doc_id = 'corpus:' + hashlib.sha256(text.encode('utf-8', errors='surrogatepass')).hexdigest()[:32]
+            yield doc_id, text, text[:80]
+
+def _history_docs(backend, cache):
+    """
+    (doc_id, text, filename, user_id) per saved analysis whose text is still
+    in the analysis cache; history rows themselves hold no deck text.
+    """
+    for row in backend.iter_rows(['content_hash', 'filename', 'user_id']):
+        if not row.get('content_hash'):
+            continue
+        result = cache.find_upload(row['content_hash'])
+        if result is not None and result.get('raw_text'):
+            yield row['content_hash'], result['raw_text'], row['filename'], row['user_id']
+
+def build(index, corpus=None, history=None, cache=None, workers=1, chunksize=2000):
+    """Add the corpus CSV and/or saved history to index, then compact. Returns (added, history rows without text)."""
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=_init_worker)
+
+    def signatures(texts):
+        if executor is None:
+            return _signature_batch(texts)
+        batch = max(1, len(texts) // (workers * 4))
+        batches = [texts[i:i + batch] for i in range(0, len(texts), batch)]
+        return [s for result in executor.map(_signature_batch, batches) for s in result]
+
+    def add(docs, source):
+        # docs: (doc_id, text, label, user_id)
+        todo = [doc for doc in docs if not index.contains(doc[0])]
+        if not todo:
+            return 0
+        sigs = signatures([text for _, text, _, _ in todo])
+        return index.add_many([(doc_id, sig, source, label, user_id)
+                               for (doc_id, _, label, user_id), sig in zip(todo, sigs)], searchable_now=False)
+
+    added = missing = 0
+    try:
+        if corpus:
+            chunk = []
+            for doc_id, text, label in _corpus_docs(corpus, chunksize):
+                chunk.append((doc_id, text, label, None))
+                if len(chunk) >= chunksize:
+                    added += add(chunk, 'corpus')
+                    chunk = []
+            added += add(chunk, 'corpus')
+        if history is not None:
+            docs = list(_history_docs(history, cache))
+            missing = sum(1 for _ in history.iter_rows(['id'])) - len(docs)
+            for start in range(0, len(docs), chunksize):
+                added += add(docs[start:start + chunksize], 'history')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    index.compact()
+    return added, missing
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m similarity_index', description='Build and query the similar-pitch index.')
+    parser.add_argument('--dir', default=SIMILARITY_DIR, help='index directory (default: %(default)s)')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build_cmd = sub.add_parser('build', help='index the training corpus and saved history')
+    build_cmd.add_argument('--corpus', default=os.path.join(_HERE, 'pitches_data.csv'), help="CSV with a pitch_text column ('' skips it)")
+    build_cmd.add_argument('--no-history', action='store_true', help="don't index saved analyses")
+    build_cmd.add_argument('--history-backend', choices=['sqlite', 'supabase'], default=None)
+    build_cmd.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    build_cmd.add_argument('--chunksize', type=int, default=2000)
+    query_cmd = sub.add_parser('query', help='decks most similar to a file')
+    query_cmd.add_argument('path')
+    query_cmd.add_argument('-k', type=int, default=10)
+    sub.add_parser('stats')
+    args = parser.parse_args(argv)
+
+    index = SimilarityIndex(args.dir)
+    if args.command == 'stats':
+        print(json.dumps(index.stats(), indent=2))
+        return 0
+    from nlp_resources import ensure_nltk_data
+    # Fail fast if NLTK data is missing (fetch it with: python -m nlp_resources prefetch)
+    ensure_nltk_data()
+    if args.command == 'query':
+        from text_extractor import extract_pages, join_pages
+        text, _ = join_pages(extract_pages(args.path))
+        for hit in index.query(text_signature(text), k=args.k):
+            print(f"{hit['similarity']:.3f}  {hit['source']:<8} {hit['label'] or hit['doc_id']}")
+        return 0
+    history = cache = None
+    if not args.no_history:
+        from analysis_cache import AnalysisCache
+        from history_store import open_backend, HISTORY_BACKEND
+        history, cache = open_backend(args.history_backend or HISTORY_BACKEND), AnalysisCache()
+    started = time.perf_counter()
+    added, missing = build(index, args.corpus or None, history, cache, args.workers, args.chunksize)
+    print(f"Indexed {added} new decks in {time.perf_counter() - started:.1f}s; {len(index)} in total")
+    if missing:
+        print(f"{missing} saved analyses skipped: their text is no longer in the analysis cache")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batch_analyze
+
+def _record(path, score):
+    return json.dumps({'path': path, 'result': {'section_score': score, 'sections': {'Problem': True}}})
+
+def test_resume_to_parquet_skips_torn_and_blank_lines(tmp_path):
+    pd = pytest.importorskip('pandas')
+    pytest.importorskip('pyarrow')
+    decks = tmp_path / 'decks'
+    decks.mkdir()
+    for name in ('a.txt', 'b.txt'):
+        (decks / name).write_text('Our problem and solution.')
+    out = str(tmp_path / 'results.parquet')
+    checkpoint = batch_analyze.checkpoint_path(out)
+    a, b = str(decks / 'a.txt'), str(decks / 'b.txt')
+    # A previous run that finished both decks, then died mid-write of a third
+    with open(checkpoint, 'w', encoding='utf-8') as f:
+        f.write(_record(a, 3) + '\n\n' + _record(b, 5) + '\n{"path": "c.txt", "res')
+
+    assert batch_analyze.run(str(decks), out, workers=1) == 0
+    frame = pd.read_parquet(out)
+    assert sorted(frame['path']) == [a, b]
+    assert json.loads(frame.loc[frame['path'] == a, 'sections'].item()) == {'Problem': True}
+
+    # Resuming again must not keep appending blank lines
+    size = os.path.getsize(checkpoint)
+    assert batch_analyze.run(str(decks), out, workers=1) == 0
+    assert os.path.getsize(checkpoint) == size
+    assert len(pd.read_parquet(out)) == 2
+
+def test_ends_torn(tmp_path):
+    path = tmp_path / 'x.checkpoint.jsonl'
+    assert not batch_analyze.ends_torn(str(path))
+    path.write_text(_record('a', 1) + '\n')
+    assert not batch_analyze.ends_torn(str(path))
+    path.write_text(_record('a', 1) + '\n{"pa')
+    assert batch_analyze.ends_torn(str(path))
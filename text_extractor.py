@@ -1,66 +1,278 @@
+import hashlib
+import io
+import multiprocessing
 import os
-import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
 import docx2txt
 import PyPDF2
 import pptx
+from metrics import timer
 
-def extract_text_from_pdf(file):
-    text = ""
+# extract_text accepts bytes, a binary file-like object or a path. Everything
+# is parsed straight from memory or the open file; no temp copies are made.
+#
+# iter_pages streams (page number, text) chunks, one per PDF page or PPTX
+# slide (DOCX and TXT are a single chunk), and stops early once any of the
+# page, character or time budgets is used up.
+
+MAX_PAGES = int(os.getenv('PITCH_EXTRACT_MAX_PAGES', '300'))
+MAX_CHARS = int(os.getenv('PITCH_EXTRACT_MAX_CHARS', '2000000'))
+TIME_BUDGET = float(os.getenv('PITCH_EXTRACT_TIME_BUDGET', '60'))
+# Processes used to extract PDF pages in parallel (0 = in this process)
+PAGE_WORKERS = int(os.getenv('PITCH_EXTRACT_WORKERS', '0'))
+PAGES_PER_TASK = 16
+
+# Upload limits. PPTX and DOCX are zip archives: their members' decompressed
+# sizes are read from the central directory and checked before python-pptx
+# or docx2txt inflates anything (zipfile never inflates a member past its
+# declared size, so the check can't be lied to), which stops zip bombs.
+MAX_UPLOAD_BYTES = int(os.getenv('PITCH_MAX_UPLOAD_MB', '50')) * 1024 * 1024
+MAX_MEMBER_BYTES = int(os.getenv('PITCH_EXTRACT_MAX_MEMBER_MB', '100')) * 1024 * 1024
+MAX_ARCHIVE_BYTES = int(os.getenv('PITCH_EXTRACT_MAX_ARCHIVE_MB', '300')) * 1024 * 1024
+MAX_ARCHIVE_MEMBERS = int(os.getenv('PITCH_EXTRACT_MAX_MEMBERS', '10000'))
+
+# File signatures. A PDF header may follow up to 1 KiB of junk.
+SNIFF_BYTES = 1024
+PDF_MAGIC = b'%PDF-'
+ZIP_MAGIC = b'PK\x03\x04'
+OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+# Package part that identifies each Office Open XML format
+OOXML_PARTS = {'ppt/presentation.xml': '.pptx', 'word/document.xml': '.docx'}
+
+class UnsupportedFile(ValueError):
+    """The content is not a PDF, PPTX, DOCX or text file, whatever its name says."""
+
+class ArchiveTooLarge(ValueError):
+    """A zip whose members would decompress past the configured caps."""
+
+def sniff_filetype(head, claimed=None):
+    """
+    File type from an upload's first SNIFF_BYTES bytes: '.pdf', '.zip' (any
+    zip; see archive_filetype) or '.txt'. Text has no signature, so it is
+    only accepted when claimed is '.txt' and head has no NUL bytes. Raises
+    UnsupportedFile otherwise.
+    """
+    if PDF_MAGIC in head[:SNIFF_BYTES]:
+        return '.pdf'
+    if head.startswith(ZIP_MAGIC):
+        return '.zip'
+    if head.startswith(OLE_MAGIC):
+        raise UnsupportedFile("Legacy Office files (.ppt, .doc) aren't supported; save as PPTX or DOCX")
+    if (claimed or '').lower() == '.txt' and b'\x00' not in head:
+        return '.txt'
+    raise UnsupportedFile("Unsupported file type; upload a PDF, PPTX, DOCX or TXT file")
+
+def check_archive_members(members, max_member=MAX_MEMBER_BYTES, max_total=MAX_ARCHIVE_BYTES):
+    """Raise ArchiveTooLarge unless the ZipInfo members stay within the caps."""
+    if len(members) > MAX_ARCHIVE_MEMBERS:
+        raise ArchiveTooLarge(f"Archive has {len(members)} members (limit {MAX_ARCHIVE_MEMBERS})")
+    total = 0
+    for member in members:
+        if member.file_size > max_member:
+            raise ArchiveTooLarge(f"{member.filename} decompresses to {member.file_size} bytes (limit {max_member})")
+        total += member.file_size
+    if total > max_total:
+        raise ArchiveTooLarge(f"Archive decompresses to {total} bytes (limit {max_total})")
+
+def archive_filetype(source):
+    """
+    '.pptx' or '.docx' for an Office Open XML zip given as bytes, a path or a
+    seekable stream (left where it was). Raises ArchiveTooLarge past the caps
+    and UnsupportedFile for any other zip.
+    """
+    stream, owned = _open_source(source)
     try:
-        reader = PyPDF2.PdfReader(file)
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + " "
-    except Exception:
-        return ""
-    return text.strip()
+        position = stream.tell()
+        with zipfile.ZipFile(stream) as archive:
+            members = archive.infolist()
+        stream.seek(position)
+    except zipfile.BadZipFile:
+        raise UnsupportedFile("Corrupt or truncated zip archive")
+    finally:
+        if owned:
+            stream.close()
+    check_archive_members(members)
+    names = {member.filename for member in members}
+    for part, filetype in OOXML_PARTS.items():
+        if part in names:
+            return filetype
+    raise UnsupportedFile("Zip archive is neither a PPTX nor a DOCX file")
 
-def extract_text_from_docx(file):
+def detect_filetype(source, claimed=None):
+    """The real type of a complete upload (bytes, path or seekable stream); see sniff_filetype and archive_filetype."""
+    stream, owned = _open_source(source)
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-            tmp.write(file.read())
-            tmp_path = tmp.name
-        text = docx2txt.process(tmp_path)
-        os.unlink(tmp_path)
-        return text.strip()
-    except Exception:
-        return ""
+        position = stream.tell()
+        head = stream.read(SNIFF_BYTES)
+        stream.seek(position)
+        filetype = sniff_filetype(head, claimed)
+        return archive_filetype(stream) if filetype == '.zip' else filetype
+    finally:
+        if owned:
+            stream.close()
 
-def extract_text_from_pptx(file):
-    text = ""
+def _open_source(source):
+    """Returns (binary stream, whether we opened it and must close it)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source), True
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, 'rb'), True
+    return source, False
+
+def iter_pdf_pages(file):
+    reader = PyPDF2.PdfReader(file)
+    for number, page in enumerate(reader.pages, start=1):
+        yield number, page.extract_text() or ""
+
+def _pdf_page_range(source, start, stop):
+    # Runs in a page worker: parse the document and extract pages [start, stop)
+    stream, _ = _open_source(source)
+    with stream:
+        reader = PyPDF2.PdfReader(stream)
+        return [(n + 1, reader.pages[n].extract_text() or "") for n in range(start, min(stop, len(reader.pages)))]
+
+_page_executor = None
+
+def _iter_pdf_pages_parallel(source, max_pages, workers):
+    global _page_executor
+    stream, owned = _open_source(source)
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pptx") as tmp:
-            tmp.write(file.read())
-            tmp_path = tmp.name
-        prs = pptx.Presentation(tmp_path)
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text:
-                    text += shape.text + " "
-        os.unlink(tmp_path)
-    except Exception:
-        return ""
-    return text.strip()
+        page_count = len(PyPDF2.PdfReader(stream).pages)
+    finally:
+        if owned:
+            stream.close()
+    if _page_executor is None:
+        _page_executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    stop = min(page_count, max_pages)
+    futures = [_page_executor.submit(_pdf_page_range, source, start, start + PAGES_PER_TASK)
+               for start in range(0, stop, PAGES_PER_TASK)]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        # Early exit (budget hit or consumer stopped): drop ranges not started yet
+        for future in futures:
+            future.cancel()
 
-def extract_text_from_txt(file):
+def iter_pptx_slides(file):
+    prs = pptx.Presentation(file)
+    for number, slide in enumerate(prs.slides, start=1):
+        yield number, " ".join(shape.text for shape in slide.shapes if hasattr(shape, "text") and shape.text)
+
+def _iter_docx(file):
+    # docx2txt opens the archive with zipfile, which takes a file object
+    yield 1, docx2txt.process(file)
+
+def _iter_txt(file):
+    yield 1, file.read().decode("utf-8", errors="ignore")
+
+PAGE_ITERATORS = {
+    ".pdf": iter_pdf_pages,
+    ".docx": _iter_docx,
+    ".pptx": iter_pptx_slides,
+    ".txt": _iter_txt,
+}
+
+def iter_pages(source, filetype=None, max_pages=MAX_PAGES, max_chars=MAX_CHARS, time_budget=TIME_BUDGET, workers=PAGE_WORKERS):
+    """
+    Yield (page number, text) for each page/slide of source, in order.
+    Stops after max_pages pages, once max_chars characters have been yielded
+    (the last chunk is cut to fit) or after time_budget seconds. workers > 0
+    extracts PDF pages in that many processes; source must then be bytes or a path.
+    Unreadable files, and PPTX/DOCX archives past the decompression caps, yield nothing.
+    """
+    if filetype is None and isinstance(source, (str, os.PathLike)):
+        filetype = os.path.splitext(source)[1]
+    filetype = (filetype or "").lower()
+    if filetype not in PAGE_ITERATORS:
+        return
+    deadline = time.monotonic() + time_budget
+    chars = 0
+    stream, owned, pages = None, False, None
     try:
-        return file.read().decode("utf-8", errors="ignore").strip()
+        if filetype == ".pdf" and workers > 0 and not hasattr(source, "read"):
+            pages = _iter_pdf_pages_parallel(source, max_pages, workers)
+        else:
+            stream, owned = _open_source(source)
+            if filetype in ('.pptx', '.docx'):
+                archive_filetype(stream)
+            pages = PAGE_ITERATORS[filetype](stream)
+        for number, text in pages:
+            if number > max_pages:
+                break
+            if text:
+                text = text[:max_chars - chars]
+                chars += len(text)
+                yield number, text
+            if chars >= max_chars or time.monotonic() > deadline:
+                break
     except Exception:
-        return ""
+        return
+    finally:
+        if pages is not None:
+            pages.close()
+        if owned:
+            stream.close()
+
+def extract_pages(source, filetype=None, **limits):
+    """List of (page number, text) chunks; see iter_pages for the limits."""
+    with timer('extract'):
+        return list(iter_pages(source, filetype, **limits))
+
+def join_pages(chunks):
+    """
+    Returns (text, page_starts): the chunks joined the way extract_text joins
+    them, and [(offset in text, page number)] for where each chunk starts.
+    """
+    parts = []
+    page_starts = []
+    offset = 0
+    for number, text in chunks:
+        page_starts.append((offset, number))
+        parts.append(text)
+        offset += len(text) + 1
+    joined = " ".join(parts)
+    text = joined.lstrip()
+    lead = len(joined) - len(text)
+    return text.rstrip(), [(max(start - lead, 0), number) for start, number in page_starts]
+
+def split_pages(text, page_starts):
+    """
+    [(offset, page number, page text)] for the pages of a join_pages result;
+    the inverse of join_pages up to surrounding whitespace.
+    """
+    if not page_starts:
+        return [(0, None, text)]
+    bounds = [start for start, _ in page_starts[1:]] + [len(text)]
+    return [(start, number, text[start:end].rstrip()) for (start, number), end in zip(page_starts, bounds)]
+
+def page_fingerprint(page_text):
+    """Content hash of one page's text; unchanged slides of a revised deck keep theirs."""
+    return hashlib.sha256(page_text.encode('utf-8', errors='surrogatepass')).hexdigest()[:32]
+
+def _join(chunks):
+    return join_pages(chunks)[0]
+
+def extract_text_from_pdf(file):
+    return _join(iter_pages(file, ".pdf"))
+
+def extract_text_from_docx(file):
+    return _join(iter_pages(file, ".docx"))
+
+def extract_text_from_pptx(file):
+    return _join(iter_pages(file, ".pptx"))
+
+def extract_text_from_txt(file):
+    return _join(iter_pages(file, ".txt"))
 
-def extract_text(file, filetype):
+def extract_text(source, filetype=None):
     """
-    filetype: extension with dot, e.g. '.pdf', '.docx', etc.
+    source: bytes, a binary file-like object or a path.
+    filetype: extension with dot, e.g. '.pdf', '.docx', etc. Taken from the
+    path when omitted.
     Returns extracted text or empty string if failed.
     """
-    if filetype == ".pdf":
-        return extract_text_from_pdf(file)
-    elif filetype == ".docx":
-        return extract_text_from_docx(file)
-    elif filetype == ".pptx":
-        return extract_text_from_pptx(file)
-    elif filetype == ".txt":
-        return extract_text_from_txt(file)
-    else:
-        return "" 
\ No newline at end of file
+    with timer('extract'):
+        return _join(iter_pages(source, filetype))
@@ -1,80 +1,272 @@
 # train_model.py
+#
+# Trains the pitch quality model served by pitch_model.py.
+#     python train_model.py                                  # TF-IDF + random forest (default)
+#     python train_model.py --data big.csv --workers 8 --n-jobs 8
+#     python train_model.py --data huge.csv --mode online --epochs 3
+#
+# The CSV is read in chunks and each chunk is preprocessed on a process pool.
+# Preprocessed text is cached on disk by content, so re-runs and extra online
+# epochs skip tokenization and lemmatization for pitches already seen.
+#   forest: TfidfVectorizer + RandomForestRegressor (fitted with --n-jobs).
+#           Needs every preprocessed pitch in memory, not the raw CSV. The
+#           forest is also exported to --compact-out (see compact_forest),
+#           which is what the API loads.
+#   online: HashingVectorizer + SGDRegressor.partial_fit, one chunk at a
+#           time, for data that doesn't fit in memory.
+# The keyword IDF model (see keyword_model) is refitted from the same CSV and
+# written to --keyword-out.
+# Wall-clock time and memory are reported for every stage.
 
-import pandas as pd
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error
-import joblib
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
-import string
-import re
-
-# Ensure NLTK data is downloaded
-nltk.download('punkt', quiet=True)
-nltk.download('stopwords', quiet=True)
-nltk.download('wordnet', quiet=True)
-
-# Text Preprocessing Function (consistent with app)
-def preprocess_text(text):
-    text = text.lower()
-    text = re.sub(r'\d+', '', text) # Remove numbers
-    tokens = word_tokenize(text)
-    stop_words = set(stopwords.words('english'))
-    punctuations = string.punctuation
-    filtered_tokens = [word for word in tokens if word not in stop_words and word not in punctuations and word.isalpha()]
-    lemmatizer = WordNetLemmatizer()
-    lemmatized_tokens = [lemmatizer.lemmatize(token) for token in filtered_tokens]
-    return " ".join(lemmatized_tokens)
-
-# 1. Load the dataset
-try:
-    df = pd.read_csv('pitches_data.csv')
-    print("Dataset loaded successfully.")
-except FileNotFoundError:
-    print("Error: 'pitches_data.csv' not found. Please create it first.")
-    exit()
-
-# Ensure columns are correct
-if 'pitch_text' not in df.columns or 'score' not in df.columns:
-    print("Error: CSV must have 'pitch_text' and 'score' columns.")
-    exit()
-
-df.dropna(inplace=True) # Remove rows with missing data
-
-# 2. Preprocess the pitch text
-print("Preprocessing text data...")
-df['processed_text'] = df['pitch_text'].apply(preprocess_text)
-
-# 3. Define features (X) and target (y)
-X = df['processed_text']
-y = df['score']
-
-# 4. Create and fit the TF-IDF Vectorizer
-vectorizer = TfidfVectorizer(max_features=3000, min_df=2, ngram_range=(1, 2))
-X_vectorized = vectorizer.fit_transform(X)
-print("Text vectorization complete.")
-
-# 5. Split data for training and testing
-X_train, X_test, y_train, y_test = train_test_split(X_vectorized, y, test_size=0.2, random_state=42)
-
-# 6. Initialize and train the Machine Learning model
-print("Training the RandomForestRegressor model...")
-model = RandomForestRegressor(n_estimators=150, max_depth=10, min_samples_leaf=2, random_state=42)
-model.fit(X_train, y_train)
-print("Model training complete.")
-
-# 7. Evaluate the model (optional but recommended)
-predictions = model.predict(X_test)
-mse = mean_squared_error(y_test, predictions)
-print(f"Model Performance (Mean Squared Error): {mse:.2f}")
-
-# 8. Save the trained model and the vectorizer
-joblib.dump(model, 'pitch_quality_model.pkl')
-joblib.dump(vectorizer, 'tfidf_vectorizer.pkl')
-
-print("\n✅ Model and vectorizer have been saved successfully!")
-print("Files created: 'pitch_quality_model.pkl' and 'tfidf_vectorizer.pkl'") 
\ No newline at end of file
+import argparse
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from metrics import peak_rss_mb
+from nlp_resources import ensure_nltk_data
+from nlp_utils import preprocess_for_model
+from pitch_model import MODEL_PATH, VECTORIZER_PATH, COMPACT_MODEL_PATH
+from keyword_model import KEYWORD_VECTORIZER_PATH, fit_keyword_vectorizer
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+PREPROCESS_CACHE_PATH = os.getenv('PITCH_PREPROCESS_CACHE_PATH') or os.path.join(_HERE, '.cache', 'preprocess.sqlite3')
+
+def _peak_rss(children=False):
+    peak = peak_rss_mb(children)
+    return 'n/a' if peak is None else f"{peak:.0f} MB"
+
+@contextmanager
+def stage(name):
+    """Print the block's wall-clock time and this process's peak RSS after it."""
+    print(f"[{name}] ...", flush=True)
+    started = time.perf_counter()
+    yield
+    print(f"[{name}] {time.perf_counter() - started:.2f}s, peak RSS {_peak_rss()}", flush=True)
+
+def preprocess_version():
+    """Salt for cache keys: changes when the preprocessing code does."""
+    h = hashlib.sha256()
+    for name in ('nlp_utils.py', 'nlp_resources.py'):
+        with open(os.path.join(_HERE, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+class PreprocessCache:
+    """preprocess_for_model output by sha256 of the raw text, in SQLite. path=None disables it."""
+
+    def __init__(self, path=PREPROCESS_CACHE_PATH):
+        self._db = None
+        self.version = preprocess_version()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS processed (key TEXT PRIMARY KEY, text TEXT NOT NULL)")
+
+    def key(self, text):
+        return self.version + hashlib.sha256(text.encode('utf-8', errors='surrogatepass')).hexdigest()
+
+    def get_many(self, keys):
+        if self._db is None or not keys:
+            return {}
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 900):
+            batch = keys[i:i + 900]
+            rows = self._db.execute(f"SELECT key, text FROM processed WHERE key IN ({','.join('?' * len(batch))})", batch)
+            found.update(rows)
+        return found
+
+    def put_many(self, items):
+        if self._db is not None and items:
+            with self._db:
+                self._db.executemany("INSERT OR REPLACE INTO processed (key, text) VALUES (?, ?)", items)
+
+def _init_worker():
+    from nlp_resources import warm_up
+    warm_up()
+
+def _preprocess_batch(texts):
+    return [preprocess_for_model(text) for text in texts]
+
+class Preprocessor:
+    """Cached preprocess_for_model over a spawn process pool (workers <= 1 runs in-process)."""
+
+    def __init__(self, workers, cache):
+        self.cache = cache
+        self.workers = workers
+        self._executor = None
+        if workers > 1:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=_init_worker,
+            )
+        self.hits = self.misses = 0
+
+    def __call__(self, texts):
+        keys = [self.cache.key(text) for text in texts]
+        found = self.cache.get_many(list(set(keys)))
+        todo = {key: text for key, text in zip(keys, texts) if key not in found}
+        self.hits += len(texts) - len(todo)
+        self.misses += len(todo)
+        if todo:
+            pending = list(todo.values())
+            if self._executor is None:
+                processed = _preprocess_batch(pending)
+            else:
+                batch = max(1, len(pending) // (self.workers * 4))
+                batches = [pending[i:i + batch] for i in range(0, len(pending), batch)]
+                processed = [text for result in self._executor.map(_preprocess_batch, batches) for text in result]
+            fresh = dict(zip(todo, processed))
+            self.cache.put_many(list(fresh.items()))
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+
+def iter_chunks(args):
+    """(texts, scores) per CSV chunk, rows with missing values dropped."""
+    import pandas as pd
+    columns = [args.text_column, args.target_column]
+    for chunk in pd.read_csv(args.data, usecols=columns, chunksize=args.chunksize):
+        chunk = chunk.dropna()
+        yield chunk[args.text_column].astype(str).tolist(), chunk[args.target_column].astype(float).tolist()
+
+def train_forest(args, preprocess):
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import mean_squared_error
+
+    texts, scores = [], []
+    with stage('read + preprocess'):
+        for chunk_texts, chunk_scores in iter_chunks(args):
+            texts.extend(preprocess(chunk_texts))
+            scores.extend(chunk_scores)
+        print(f"{len(texts)} pitches ({preprocess.hits} preprocessed from cache)")
+    with stage('vectorize'):
+        vectorizer = TfidfVectorizer(max_features=args.max_features, min_df=args.min_df, ngram_range=(1, args.ngram_max))
+        X = vectorizer.fit_transform(texts)
+        del texts
+    X_train, X_test, y_train, y_test = train_test_split(X, scores, test_size=args.test_size, random_state=args.random_state)
+    with stage('fit'):
+        model = RandomForestRegressor(
+            n_estimators=args.n_estimators, max_depth=args.max_depth, min_samples_leaf=args.min_samples_leaf,
+            n_jobs=args.n_jobs, random_state=args.random_state,
+        )
+        model.fit(X_train, y_train)
+    with stage('evaluate'):
+        mse = mean_squared_error(y_test, model.predict(X_test))
+    # The API scores in several worker processes already; don't fan out per predict
+    model.set_params(n_jobs=None)
+    return vectorizer, model, mse
+
+def train_online(args, preprocess):
+    import numpy as np
+    import scipy.sparse as sp
+    from sklearn.feature_extraction.text import HashingVectorizer
+    from sklearn.linear_model import SGDRegressor
+    from sklearn.metrics import mean_squared_error
+
+    vectorizer = HashingVectorizer(n_features=args.n_features, ngram_range=(1, args.ngram_max), alternate_sign=False)
+    # partial_fit never sees the whole data, so a fixed step size converges far
+    # more reliably than the default schedule (which barely moves the intercept)
+    model = SGDRegressor(alpha=args.alpha, learning_rate='constant', eta0=args.eta0, random_state=args.random_state)
+    test_X, test_y = [], []
+    for epoch in range(args.epochs):
+        # Same seed every epoch, so the held-out rows stay the same
+        rng = np.random.default_rng(args.random_state)
+        with stage(f'epoch {epoch + 1}/{args.epochs}'):
+            rows = 0
+            for chunk_texts, chunk_scores in iter_chunks(args):
+                X = vectorizer.transform(preprocess(chunk_texts))
+                y = np.asarray(chunk_scores)
+                held_out = rng.random(len(y)) < args.test_size
+                if held_out.all():
+                    continue
+                model.partial_fit(X[~held_out], y[~held_out])
+                if epoch == 0 and held_out.any():
+                    test_X.append(X[held_out])
+                    test_y.append(y[held_out])
+                rows += len(y)
+            print(f"{rows} pitches ({preprocess.hits} preprocessed from cache so far)")
+    with stage('evaluate'):
+        mse = mean_squared_error(np.concatenate(test_y), model.predict(sp.vstack(test_X))) if test_y else float('nan')
+    return vectorizer, model, mse
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the pitch quality model.')
+    parser.add_argument('--data', default=os.path.join(_HERE, 'pitches_data.csv'), help='CSV of labelled pitches (default: %(default)s)')
+    parser.add_argument('--text-column', default='pitch_text')
+    parser.add_argument('--target-column', default='score')
+    parser.add_argument('--mode', choices=['forest', 'online'], default='forest')
+    parser.add_argument('--model-out', default=MODEL_PATH)
+    parser.add_argument('--vectorizer-out', default=VECTORIZER_PATH)
+    parser.add_argument('--keyword-out', default=KEYWORD_VECTORIZER_PATH, help="keyword IDF model (see keyword_model; '' skips it)")
+    parser.add_argument('--chunksize', type=int, default=10_000, help='CSV rows read at a time')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='preprocessing processes')
+    parser.add_argument('--cache', default=PREPROCESS_CACHE_PATH, help="preprocessed text cache ('' disables it)")
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--random-state', type=int, default=42)
+    parser.add_argument('--ngram-max', type=int, default=2)
+    forest = parser.add_argument_group('forest mode')
+    forest.add_argument('--max-features', type=int, default=3000)
+    forest.add_argument('--min-df', type=int, default=2)
+    forest.add_argument('--n-estimators', type=int, default=150)
+    forest.add_argument('--max-depth', type=int, default=10)
+    forest.add_argument('--min-samples-leaf', type=int, default=2)
+    forest.add_argument('--n-jobs', type=int, default=-1, help='trees fitted in parallel (-1: all cores)')
+    forest.add_argument('--compact-out', default=COMPACT_MODEL_PATH, help="compact .npz export of the forest ('' skips it)")
+    forest.add_argument('--float32', action='store_true', help='store the compact export as float32')
+    online = parser.add_argument_group('online mode')
+    online.add_argument('--n-features', type=int, default=2**20, help='hashing vectorizer width')
+    online.add_argument('--alpha', type=float, default=1e-4, help='SGD regularization strength')
+    online.add_argument('--eta0', type=float, default=0.05, help='SGD step size')
+    online.add_argument('--epochs', type=int, default=1)
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.data):
+        parser.error(f"{args.data} not found")
+
+    # Fail fast if NLTK data is missing (fetch it with: python -m nlp_resources prefetch)
+    ensure_nltk_data()
+    import joblib
+    preprocess = Preprocessor(args.workers, PreprocessCache(args.cache or None))
+    try:
+        with stage('total'):
+            train = train_forest if args.mode == 'forest' else train_online
+            vectorizer, model, mse = train(args, preprocess)
+            print(f"Model Performance (Mean Squared Error): {mse:.2f}")
+            with stage('save'):
+                joblib.dump(model, args.model_out)
+                joblib.dump(vectorizer, args.vectorizer_out)
+            if args.mode == 'forest' and args.compact_out:
+                with stage('export compact'):
+                    from compact_forest import export_forest
+                    export_forest(args.model_out, args.compact_out, args.float32)
+            if args.keyword_out:
+                with stage('keyword model'):
+                    joblib.dump(fit_keyword_vectorizer(args.data, args.text_column), args.keyword_out)
+    except ValueError as e:
+        # pandas/sklearn: missing columns, empty data, too few rows for min_df...
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        preprocess.close()
+    if preprocess.workers > 1:
+        # Only covers workers that have exited, which close() waited for
+        print(f"Peak RSS of a preprocessing worker: {_peak_rss(children=True)}")
+    print(f"Saved {args.model_out} and {args.vectorizer_out}")
+    if args.mode == 'forest' and args.compact_out:
+        print(f"Compact forest written to {args.compact_out}")
+    if args.keyword_out:
+        print(f"Keyword model written to {args.keyword_out}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
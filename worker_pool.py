@@ -0,0 +1,152 @@
+# worker_pool.py
+#
+# Runs CPU-bound extraction and analysis in a process pool so a large deck
+# never blocks the API's event loop. Admission is bounded: once
+# POOL_MAX_QUEUE tasks are running or waiting, new work is refused with
+# PoolBusy instead of queueing without limit.
+#
+# A worker that crashes breaks its whole executor, and one stuck past the
+# timeout can't be cancelled; either way the executor is swapped for fresh
+# workers, and a stuck one is killed once its siblings have finished their
+# tasks.
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+POOL_SIZE = int(os.getenv('PITCH_POOL_SIZE', str(os.cpu_count() or 2)))
+POOL_MAX_QUEUE = int(os.getenv('PITCH_POOL_MAX_QUEUE', str(4 * POOL_SIZE or 8)))
+POOL_TASK_TIMEOUT = float(os.getenv('PITCH_POOL_TASK_TIMEOUT', '120'))
+
+class PoolBusy(Exception):
+    """Raised when the pool already holds POOL_MAX_QUEUE tasks."""
+
+def init_worker():
+    """Process initializer: load NLP resources and the models once per worker."""
+    from nlp_resources import warm_up
+    from pitch_model import load_model
+    from keyword_model import load_keyword_model
+    warm_up()
+    load_model()
+    load_keyword_model()
+
+def _ready():
+    return os.getpid()
+
+class AnalysisPool:
+    """
+    size=0 runs tasks on the event loop's default thread pool in this process
+    (useful for development and tests).
+    """
+
+    def __init__(self, size=POOL_SIZE, max_queue=POOL_MAX_QUEUE, timeout=POOL_TASK_TIMEOUT):
+        self.size = size
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.pending = 0
+        self.replaced = 0
+        self._executor = None
+        # executor -> its unfinished tasks, and the ones among them that timed out
+        self._tasks = {}
+        self._hung = {}
+
+    def _new_executor(self):
+        return ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        )
+
+    def start(self):
+        """Start the workers and block until each has loaded the NLP resources and model."""
+        if self.size <= 0:
+            init_worker()
+            return
+        self._executor = self._new_executor()
+        # The executor spawns workers lazily; make them all start (and warm) now
+        futures = [self._executor.submit(_ready) for _ in range(self.size)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        for executor in list(self._tasks):
+            self._kill(executor)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args, timeout=None):
+        """
+        Run fn(*args) in a worker. Raises PoolBusy when the queue is full,
+        asyncio.TimeoutError after timeout (default self.timeout) seconds and
+        BrokenProcessPool when a worker died under the task.
+        """
+        if self.pending >= self.max_queue:
+            raise PoolBusy(f"{self.pending} analysis tasks already queued")
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            future = loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A worker died since the last task; this one never started, so
+            # it can go to fresh workers
+            self._replace(executor)
+            executor = self._executor
+            future = loop.run_in_executor(executor, fn, *args)
+        self.pending += 1
+        if executor is not None:
+            self._tasks.setdefault(executor, set()).add(future)
+        # A timed-out task keeps its slot until its worker finishes or is killed
+        future.add_done_callback(functools.partial(self._release, executor))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            if executor is not None and not future.done():
+                self._hung.setdefault(executor, set()).add(future)
+                self._replace(executor)
+            raise
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+
+    def _replace(self, executor):
+        """Send new tasks to fresh workers instead of executor (once per executor)."""
+        if executor is None or executor is not self._executor:
+            return
+        self._tasks.setdefault(executor, set())
+        self._executor = self._new_executor()
+        self.replaced += 1
+        # Start the new workers warming up now rather than on the first task
+        for _ in range(self.size):
+            self._executor.submit(_ready)
+        self._reap(executor)
+
+    def _reap(self, executor):
+        """Shut a replaced executor down once only its timed-out tasks are left."""
+        if executor is self._executor or executor not in self._tasks:
+            return
+        remaining = self._tasks[executor]
+        if remaining <= self._hung.get(executor, set()):
+            self._kill(executor)
+
+    def _kill(self, executor):
+        self._tasks.pop(executor, None)
+        hung = self._hung.pop(executor, None)
+        if hung:
+            # The tasks can't be cancelled once running; end their processes
+            for process in list((executor._processes or {}).values()):
+                process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, executor, future):
+        self.pending -= 1
+        if not future.cancelled():
+            # Timed-out tasks' results and errors are never awaited
+            future.exception()
+        if executor in self._tasks:
+            self._tasks[executor].discard(future)
+            self._hung.get(executor, set()).discard(future)
+            self._reap(executor)